@@ -1,27 +1,82 @@
-from flask import Flask, request, render_template
+from flask import Flask, Response, request, render_template, jsonify
 from src.config import Config
-from src.recommendation import Recommender
+from src.utils import LoggerFactory
+from src.metrics import StageTimer, metrics, render_counters
+from src.serving import ServingModel
+from src.recommendation_table import RecommendationTable
+from src.micro_batcher import MicroBatcher
 
+logger = LoggerFactory.create_logger()
 app = Flask(__name__)
 
-recommender = Recommender()
-recommender.load_interactions()
+# Load the compact serving artifact written by main.py; without it, build the same
+# model from the interactions file (a much slower start)
+model = ServingModel()
+if not model.reload_if_changed():
+    model.build_from_interactions()
 
-interaction_df = recommender.interaction_df
-users = interaction_df["user_id"].unique()
-categories = interaction_df["category"].unique()
-occasions = interaction_df["rented for"].unique()
+table = RecommendationTable() if Config.SERVING_MODE == "precomputed" else None
+if table is not None:
+    table.reload_if_changed()
+
+def score_batch(queries):
+    # Runs on the batcher thread: one search per (occasion, category) for the whole batch
+    model.reload_if_changed()
+    return model.recommend_many(queries)
+
+batcher = MicroBatcher(score_batch)
+
+users = model.user_ids
+categories = list(dict.fromkeys(category for _, category in model.partitions))
+occasions = list(dict.fromkeys(occasion for occasion, _ in model.partitions))
+
+def parse_user_id(value):
+    # Any value float() accepts, kept as given so responses echo it back
+    float(value)
+    return value
+
+def parse_name(value) -> str:
+    # Category and occasion names are looked up in dictionaries, so only strings are accepted
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {type(value).__name__}.")
+    return value
+
+def parse_top_n(value) -> int:
+    # At least one recommendation, at most Config.MAX_RECOMMENDATIONS
+    top_n = int(value)
+    if top_n < 1:
+        raise ValueError(f"top_n must be at least 1, got {top_n}.")
+    return min(top_n, Config.MAX_RECOMMENDATIONS)
+
+def recommend(user_id, occasion, category, top_n):
+    # Answer from the precomputed table when it has the entry, otherwise score live;
+    # both pick up a rerun of the pipeline, which also invalidates the cached results
+    timer = StageTimer(metrics)
+    recommendations = None
+    if table is not None:
+        table.reload_if_changed()
+        recommendations = table.recommend_items(user_id, occasion, category, top_n=top_n)
+        timer.lap("table_lookup")
+    source = "table"
+    if recommendations is None:
+        recommendations = batcher.submit((user_id, occasion, category, top_n)).result()
+        timer.lap("live")
+        source = "live"
+    timer.finish("request", source=source, top_n=top_n)
+    return recommendations
 
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
-        user_id = request.form.get("user_id")
-        category = request.form.get("category")
-        occasion = request.form.get("occasion")
-        top_n = int(request.form.get("top_n", Config.NUM_RECOMMENDATIONS))
+        try:
+            user_id = parse_user_id(request.form.get("user_id"))
+            category = parse_name(request.form.get("category"))
+            occasion = parse_name(request.form.get("occasion"))
+            top_n = parse_top_n(request.form.get("top_n", Config.NUM_RECOMMENDATIONS))
+        except (TypeError, ValueError):
+            return "Expected a numeric user_id, a category, an occasion and a top_n of at least 1.", 400
 
-        recommendations = recommender.recommend_items(user_id, occasion, category, top_n=top_n)
-        rec_records = recommendations.to_dict(orient="records")
+        rec_records = recommend(user_id, occasion, category, top_n)
         return render_template("results.html", 
                                recommendations=rec_records,
                                user_id=user_id,
@@ -30,6 +85,48 @@ def index():
     else:
         return render_template("index.html", users=users, categories=categories, occasions=occasions)
 
+@app.route("/api/recommend", methods=["POST"])
+def api_recommend():
+    """JSON API: {"user_id", "category", "occasion", "top_n"} -> {"recommendations": [...]}; top_n is capped at Config.MAX_RECOMMENDATIONS."""
+    payload = request.get_json(silent=True) or {}
+    try:
+        user_id = parse_user_id(payload["user_id"])
+        category = parse_name(payload["category"])
+        occasion = parse_name(payload["occasion"])
+        top_n = parse_top_n(payload.get("top_n", Config.NUM_RECOMMENDATIONS))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Expected a JSON object with a numeric user_id, string category and occasion and an optional integer top_n "
+                                 f"of at least 1 (at most {Config.MAX_RECOMMENDATIONS} are returned)."}), 400
+
+    return jsonify({
+        "user_id": user_id,
+        "category": category,
+        "occasion": occasion,
+        "recommendations": recommend(user_id, occasion, category, top_n),
+    })
+
+@app.route("/cache_stats")
+def cache_stats():
+    stats = {"results": model.result_cache.stats()}
+    if table is not None:
+        stats["table"] = table.result_cache.stats()
+    stats["micro_batches"] = batcher.stats()
+    return jsonify(stats)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms and cache counters in the Prometheus text format."""
+    caches = {"results": model.result_cache}
+    if table is not None:
+        caches["table"] = table.result_cache
+    body = metrics.render()
+    body += render_counters("recommender_cache_hits_total", "Result cache hits.",
+                            {name: cache.hits for name, cache in caches.items()}, "cache")
+    body += render_counters("recommender_cache_misses_total", "Result cache misses.",
+                            {name: cache.misses for name, cache in caches.items()}, "cache")
+    body += render_counters("recommender_micro_batches_total", "Micro-batches scored and the requests they held.",
+                            {"batches": batcher.batches, "requests": batcher.items}, "kind")
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
-
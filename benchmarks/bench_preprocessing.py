@@ -0,0 +1,146 @@
+"""Benchmark the vectorized preprocessing hot paths against the previous row-by-row versions.
+
+Checks that both produce identical output (same values and dtypes), first on fixed
+edge cases, then on the data before timing them. "synthetic" benchmarks generated
+data instead of the raw file, so the whole check runs offline. Run from the
+repository root:
+    python -m benchmarks.bench_preprocessing [path/to/renttherunway_final_data.json.gz | synthetic [rows]]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.config import Config
+from src.data_ingestion import DataIngestion
+from src.data_processing import DataProcessor
+from src.utils import TextCleaner
+from benchmarks.synthetic_data import write_jsonl
+
+# Inputs the row-by-row versions handled in their own way: missing values, partial
+# heights, stray spaces and quotes, decimals and non-ASCII letters and digits
+EDGE_CASES = {
+    "review_text": [np.nan, None, "", "Fits GREAT!! 10/10", "  spaces\tand\nnewlines  ", "Très jolie, naïve café",
+                    "ｆｕｌｌ－ｗｉｄｔｈ ５", "emoji 👗 dress", "ß straße İstanbul", 5],
+    "height": [np.nan, "5' 6\"", "5'6\"", "6'", "5' 6.5\"", "5 '6\"", "5' ６\"", "５' 4\"", "5' 11", "'6\"", "5'' 6\"",
+               "5' 6\" '", "tall", ""],
+    "weight": [np.nan, "137lbs", "137 lbs", " 137lbs ", "137.5lbs", "lbs", "１３７lbs", "137kg", ""],
+    "bust size": [np.nan, "34d", "34dd", "34d+", "34ddd/e", "３４b", "32", "AA", "34 DD", ""],
+}
+
+
+def legacy_clean_text(texts: pd.Series) -> pd.Series:
+    """Row-by-row text cleaning as previously done in DataProcessor.clean_data."""
+    return texts.fillna("").apply(TextCleaner.clean_text)
+
+
+def legacy_convert_heights(heights: pd.Series) -> pd.Series:
+    """Row-by-row height parsing as previously done in DataProcessor.feature_engineering."""
+    def convert_height(h):
+        if pd.isna(h):
+            return np.nan
+        parts = h.split("'")
+        if len(parts) == 2:
+            feet = parts[0]
+            inches = parts[1].replace('"', '').strip()
+            if feet.isdigit() and inches.isdigit():
+                return int(feet)*12 + int(inches)
+        return np.nan
+    return heights.apply(convert_height)
+
+
+def legacy_parse_weights(weights: pd.Series) -> pd.Series:
+    """Whole-column weight parsing as previously done in DataProcessor.feature_engineering."""
+    weights = weights.astype(str).str.replace("lbs", "", regex=False).str.strip()
+    return pd.to_numeric(weights, errors="coerce")
+
+
+def legacy_parse_bust_sizes(sizes: pd.Series) -> pd.DataFrame:
+    """Whole-column bust size parsing as previously done in DataProcessor.feature_engineering."""
+    return pd.DataFrame({
+        "bust_band": pd.to_numeric(sizes.str.extract(r"(\d+)", expand=False), errors='coerce'),
+        "bust_cup": sizes.str.extract(r"([A-Za-z]+)[^A-Za-z]*$", expand=False).str.lower(),
+    })
+
+
+def vectorized_clean_text(texts: pd.Series) -> pd.Series:
+    return TextCleaner.clean_text_series(texts.fillna(""))
+
+
+def vectorized_convert_heights(heights: pd.Series) -> pd.Series:
+    return DataProcessor().parse_measurements(pd.DataFrame({"height": heights}))["height"]
+
+
+def vectorized_parse_weights(weights: pd.Series) -> pd.Series:
+    return DataProcessor().parse_measurements(pd.DataFrame({"weight": weights}))["weight"]
+
+
+def vectorized_parse_bust_sizes(sizes: pd.Series) -> pd.DataFrame:
+    return DataProcessor().parse_measurements(pd.DataFrame({"bust size": sizes}))[["bust_band", "bust_cup"]]
+
+
+def best_of(func, arg, repeat: int = 3):
+    """Return (result, best wall time in seconds) over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg.copy())
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def assert_identical(result, expected):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    else:
+        pd.testing.assert_series_equal(result, expected, check_exact=True, check_names=False)
+
+
+def cases(df) -> list:
+    return [
+        ("review_text cleaning", df["review_text"], legacy_clean_text, vectorized_clean_text),
+        ("height parsing", df["height"], legacy_convert_heights, vectorized_convert_heights),
+        ("weight parsing", df["weight"], legacy_parse_weights, vectorized_parse_weights),
+        ("bust size parsing", df["bust size"], legacy_parse_bust_sizes, vectorized_parse_bust_sizes),
+    ]
+
+
+def check_edge_cases():
+    """Compare both versions on every edge case alone (so each column keeps its own dtype) and all together."""
+    edge_cases = {col: pd.Series(values, dtype=object) for col, values in EDGE_CASES.items()}
+    for name, column, legacy, vectorized in cases(edge_cases):
+        for i in range(len(column)):
+            assert_identical(vectorized(column.iloc[i:i + 1].copy()), legacy(column.iloc[i:i + 1].copy()))
+        assert_identical(vectorized(column.copy()), legacy(column.copy()))
+    print(f"Edge cases: identical output on {sum(len(values) for values in EDGE_CASES.values())} inputs")
+
+
+def load_data(args: list) -> pd.DataFrame:
+    if args and args[0] == "synthetic":
+        rows = int(args[1]) if len(args) > 1 else 100000
+        with tempfile.TemporaryDirectory() as workdir:
+            raw_data_file = os.path.join(workdir, "synthetic.json.gz")
+            write_jsonl(raw_data_file, rows)
+            df = DataIngestion(raw_data_file).load_raw_data()
+        print(f"Generated {len(df)} synthetic rows")
+        return df
+    raw_data_file = args[0] if args else Config.RAW_DATA_FILE
+    df = DataIngestion(raw_data_file).load_raw_data()
+    print(f"Loaded {len(df)} rows from {raw_data_file}")
+    return df
+
+
+def main():
+    check_edge_cases()
+    df = load_data(sys.argv[1:])
+    for name, column, legacy, vectorized in cases(df):
+        expected, legacy_time = best_of(legacy, column)
+        result, vectorized_time = best_of(vectorized, column)
+        assert_identical(result, expected)
+        print(f"{name}: identical output, legacy {legacy_time:.3f}s, vectorized {vectorized_time:.3f}s, "
+              f"speedup {legacy_time / vectorized_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark the web app's cold start: interpreter start, importing app.py and the first API response.
+
+Each run starts a fresh interpreter. Expects the artifacts written by main.py.
+Run from the repository root:
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+
+HEAVY_MODULES = ["pandas", "scipy", "sklearn", "torch", "sentence_transformers", "pyarrow"]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+occasion, category = app.model.partitions[0]
+response = app.app.test_client().post("/api/recommend", json={
+    "user_id": app.users[0], "occasion": occasion, "category": category,
+})
+answered = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "first_response_s": answered - imported,
+    "status": response.status_code,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["cold_start_s"] = time.perf_counter() - start
+        results.append(result)
+
+    print(f"{runs} runs, first response status {results[0]['status']}")
+    for name in ["import_s", "first_response_s", "cold_start_s"]:
+        values = [result[name] for result in results]
+        print(f"{name:>18}: median {np.median(values):.3f}  max {np.max(values):.3f}")
+    print(f"heavy modules loaded: {', '.join(results[0]['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
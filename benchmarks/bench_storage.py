@@ -0,0 +1,75 @@
+"""Benchmark loading the user interactions from a pickle against Parquet.
+
+Writes both formats from the current interactions file into a temporary directory,
+then loads them in a fresh process per case and reports load time and peak RSS
+(read from /proc on Linux).
+Run from the repository root:
+    python -m benchmarks.bench_storage [path/to/user_item_interactions.pkl|.parquet]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from src.config import Config
+from src.recommendation import Recommender
+from src.storage import save_frame, load_frame, is_parquet
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process; ru_maxrss would include the parent's peak before exec."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_load(path: str, projected: bool, partition: tuple) -> dict:
+    """Load one file in the current process and report the load time and the process's RSS before and at peak."""
+    if is_parquet(path):
+        # Import time is a one-off cost and is not part of the load
+        import pyarrow.parquet  # noqa: F401
+    columns = Recommender().interaction_columns if projected else None
+    filters = [("rented for", "==", partition[0]), ("category", "==", partition[1])] if partition else None
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    df = load_frame(path, columns=columns, filters=filters)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "rss_before_mb": rss_before, "peak_rss_mb": peak_rss_mb(), "rows": len(df), "columns": df.shape[1]}
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else Config.USER_INTERACTIONS_FILE
+    df = load_frame(source)
+    counts = df.groupby(["rented for", "category"], observed=True).size()
+    partition = tuple(counts.idxmax())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_file = os.path.join(tmp, "interactions.pkl")
+        parquet_file = os.path.join(tmp, "interactions.parquet")
+        save_frame(df, pickle_file)
+        save_frame(df, parquet_file, partition_cols=["rented for", "category"])
+        del df
+
+        cases = [
+            ("pickle, all columns", pickle_file, False, None),
+            ("parquet, all columns", parquet_file, False, None),
+            ("parquet, recommender columns", parquet_file, True, None),
+            (f"parquet, one partition {partition}", parquet_file, True, partition),
+        ]
+        print(f"{'case':<50} {'load s':>8} {'RSS before MB':>14} {'peak RSS MB':>12} {'rows':>9} {'cols':>5} {'file MB':>8}")
+        spawn = multiprocessing.get_context("spawn")
+        for name, path, projected, case_partition in cases:
+            # A fresh process per case, so every peak RSS starts from the same baseline
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                result = pool.submit(measure_load, path, projected, case_partition).result()
+            size = os.path.getsize(path) / 2**20
+            print(f"{name:<50} {result['seconds']:>8.3f} {result['rss_before_mb']:>14.1f} {result['peak_rss_mb']:>12.1f} {result['rows']:>9} "
+                  f"{result['columns']:>5} {size:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
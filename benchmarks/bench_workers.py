@@ -0,0 +1,77 @@
+"""Benchmark the memory of several serving worker processes sharing the mapped artifacts.
+
+Starts fresh interpreters that each load the serving model and recommendation table
+the way app.py does and answer random queries, then reads their memory from
+/proc (Linux only). RSS counts shared pages in every process, PSS splits them
+between the processes mapping them, and USS (private memory) is what every
+additional worker costs. Expects the artifacts written by main.py. Run from the
+repository root:
+    python -m benchmarks.bench_workers [workers] [queries]
+"""
+import os
+import subprocess
+import sys
+from src.config import Config
+from src.serving import current_generation
+
+CHILD = """
+import random, sys
+from src.serving import ServingModel
+from src.recommendation_table import RecommendationTable
+model = ServingModel()
+model.reload_if_changed()
+table = RecommendationTable()
+table.reload_if_changed()
+rng = random.Random(int(sys.argv[1]))
+users, partitions = model.user_ids, model.partitions
+for _ in range(int(sys.argv[2])):
+    query = (rng.choice(users), *rng.choice(partitions), 5)
+    if table.recommend_items(*query) is None:
+        model.recommend_items(*query)
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def memory_mb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def artifact_mb(directory: str) -> float:
+    try:
+        _, name = current_generation(directory)
+    except FileNotFoundError:
+        return 0.0
+    return os.path.getsize(os.path.join(directory, f"{name}.bin")) / 2 ** 20
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    workers = [subprocess.Popen([sys.executable, "-c", CHILD, str(seed), str(n_queries)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for seed in range(n_workers)]
+    try:
+        for worker in workers:
+            worker.stdout.readline()
+        usage = [memory_mb(worker.pid) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+
+    print(f"artifacts: model {artifact_mb(Config.SERVING_MODEL_DIR):.1f} MB, table {artifact_mb(Config.RECOMMENDATION_TABLE_DIR):.1f} MB")
+    print(f"{n_workers} workers, {n_queries} queries each")
+    for name in ["rss", "pss", "uss"]:
+        values = [worker[name] for worker in usage]
+        print(f"{name:>4}: {sum(values):8.1f} MB total, {sum(values) / len(values):7.1f} MB per worker")
+
+
+if __name__ == "__main__":
+    main()
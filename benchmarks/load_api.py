@@ -0,0 +1,66 @@
+"""Load generator for the JSON recommendation API.
+
+Sends POST /api/recommend requests from concurrent clients for random users and
+(occasion, category) partitions of the interactions file, then reports throughput
+and latency percentiles. Start the app first (python app.py), then run from the
+repository root:
+    python -m benchmarks.load_api [url] [concurrency] [requests]
+"""
+import sys
+import time
+import threading
+import numpy as np
+import requests
+from src.config import Config
+from src.storage import load_frame
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:5000/api/recommend"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    n_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+    df = load_frame(Config.USER_INTERACTIONS_FILE, columns=["user_id", "rented for", "category"])
+    users = df["user_id"].unique()
+    partitions = df[["rented for", "category"]].drop_duplicates().to_numpy()
+    rng = np.random.default_rng(0)
+    payloads = [
+        {"user_id": float(user), "occasion": str(occasion), "category": str(category), "top_n": Config.NUM_RECOMMENDATIONS}
+        for user, (occasion, category) in zip(rng.choice(users, n_requests), partitions[rng.integers(len(partitions), size=n_requests)])
+    ]
+
+    latencies = [None] * n_requests
+    errors = []
+    next_request = iter(range(n_requests))
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            response = session.post(url, json=payloads[i])
+            latencies[i] = time.perf_counter() - start
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{n_requests} requests, {concurrency} clients, {len(errors)} errors")
+    print(f"throughput: {n_requests / elapsed:.1f} req/s")
+    print(f"latency ms: p50 {np.percentile(latencies_ms, 50):.2f}  p95 {np.percentile(latencies_ms, 95):.2f}  "
+          f"p99 {np.percentile(latencies_ms, 99):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Offline stand-in for SentenceTransformer, so benchmarks run on CPU without downloading a model."""
+import zlib
+import numpy as np
+
+
+class StubEmbeddingModel:
+    """Deterministic hashed bag-of-words vectors with the shape of all-MiniLM-L6-v2 embeddings."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def encode(self, texts: list, batch_size: int = 32, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
@@ -0,0 +1,162 @@
+"""Benchmark suite on synthetic data: ingestion, cleaning, feature engineering, embeddings, scoring and end-to-end.
+
+Generates Rent the Runway-shaped data at the requested scale, runs every stage of the
+pipeline and the serving path on it with a stub embedding model, and saves the
+results as JSON so runs can be compared across commits. Run from the repository root:
+    python -m benchmarks.suite run [rows] [results.json]
+    python -m benchmarks.suite compare old.json new.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+from src.config import Config
+from src.data_ingestion import DataIngestion
+from src.data_processing import DataProcessor
+from src.recommendation import Recommender
+from src.serving import ServingModel
+from benchmarks.stub_embeddings import StubEmbeddingModel
+from benchmarks.synthetic_data import write_jsonl
+
+SCALED_COLUMNS = ["BMI", "review_length", "days_since_review", "positive_word_count", "negative_word_count"]
+
+
+def timed(results: dict, name: str, rows: int, fn, *args):
+    """Run fn once, record its wall time and throughput under name and return its result."""
+    start = time.perf_counter()
+    value = fn(*args)
+    seconds = time.perf_counter() - start
+    results[name] = {"seconds": seconds, "rows_per_second": rows / seconds if seconds else None}
+    print(f"{name:<28} {seconds:>9.3f} s")
+    return value
+
+
+def latency(results: dict, name: str, fn, calls: list):
+    """Call fn(*args) for every args in calls and record latency percentiles in milliseconds."""
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    results[name] = {
+        "calls": len(calls),
+        "mean_ms": float(np.mean(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+    print(f"{name:<28} p50 {results[name]['p50_ms']:.3f} ms  p99 {results[name]['p99_ms']:.3f} ms")
+
+
+def run_suite(rows: int, workdir: str, seed: int = 0, n_queries: int = 1000) -> dict:
+    results = {}
+    raw_file = os.path.join(workdir, "raw.json.gz")
+    timed(results, "generate_synthetic_data", rows, write_jsonl, raw_file, rows, seed)
+
+    ingestion = DataIngestion(raw_file)
+    processor = DataProcessor(
+        cleaned_data_file=os.path.join(workdir, "cleaned_data.pkl"),
+        user_interactions_file=os.path.join(workdir, "user_item_interactions.pkl"),
+        embeddings_file=os.path.join(workdir, "text_embeddings.npy"),
+        embedding_cache_file=os.path.join(workdir, "embedding_cache.sqlite"),
+    )
+    processor.embedding_model = StubEmbeddingModel()
+
+    # Pipeline stages, as main.py runs them
+    pipeline_start = time.perf_counter()
+    df = timed(results, "ingestion", rows, ingestion.load_raw_data)
+    df = timed(results, "cleaning", rows, processor.clean_data, df)
+    df = timed(results, "feature_engineering", rows, processor.feature_engineering, df)
+    df = processor.scale_features(df, [col for col in df.columns if col in SCALED_COLUMNS])
+    df = processor.order_interactions(df)
+    df = timed(results, "embeddings", rows, processor.generate_text_embeddings, df)
+    df = timed(results, "finalize_interactions", rows, processor.finalize_interactions, df)
+    timed(results, "save_interactions", rows, processor.save_user_interactions, df)
+
+    recommender = Recommender(
+        user_interactions_file=processor.user_interactions_file,
+        recommendation_file=os.path.join(workdir, "user_recommendation.pkl"),
+        item_profiles_file=os.path.join(workdir, "item_profiles.pkl"),
+        vector_index_file=os.path.join(workdir, "vector_index.npz"),
+        embeddings_file=processor.embeddings_file,
+    )
+    timed(results, "recommender_load", rows, recommender.load_interactions)
+    users = recommender.interaction_df["user_id"].unique()
+    timed(results, "recommend_batch", rows, recommender.recommend_batch, users, None, None, 3)
+    results["end_to_end_pipeline"] = {"seconds": time.perf_counter() - pipeline_start}
+    print(f"{'end_to_end_pipeline':<28} {results['end_to_end_pipeline']['seconds']:>9.3f} s")
+
+    timed(results, "streaming_processing", rows, processor.process_chunks,
+          lambda: ingestion.iter_raw_data(max(1, rows // 10)))
+
+    # Request latency without result caching, on random users and partitions
+    rng = np.random.default_rng(seed)
+    partitions = list(recommender.partitions)
+    queries = [(float(user), *partitions[p], Config.NUM_RECOMMENDATIONS)
+               for user, p in zip(rng.choice(users, n_queries), rng.integers(len(partitions), size=n_queries))]
+    recommender.result_cache.max_size = 0
+    latency(results, "recommend_items", recommender.recommend_items, queries)
+
+    model = ServingModel(os.path.join(workdir, "serving_model"))
+    timed(results, "serving_model_save", rows, model.save, recommender)
+    timed(results, "serving_model_load", rows, model.reload_if_changed)
+    model.result_cache.max_size = 0
+    latency(results, "serving_recommend_items", model.recommend_items, queries)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(rows: int, output: str = None):
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(rows, workdir)
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "rows": rows,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        output = os.path.join("benchmarks", "results", f"{commit}_{rows}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {output}")
+
+
+def compare(old_file: str, new_file: str):
+    """Print the new/old ratio of every timing both result files share."""
+    with open(old_file) as file:
+        old = json.load(file)
+    with open(new_file) as file:
+        new = json.load(file)
+    print(f"{old['commit']} ({old['rows']} rows) -> {new['commit']} ({new['rows']} rows)")
+    for name, new_result in new["results"].items():
+        old_result = old["results"].get(name)
+        if old_result is None:
+            continue
+        for metric in ["seconds", "p50_ms", "p99_ms"]:
+            if metric in new_result and metric in old_result and old_result[metric]:
+                ratio = new_result[metric] / old_result[metric]
+                print(f"{name:<28} {metric:<8} {old_result[metric]:>10.3f} {new_result[metric]:>10.3f}  x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        run(int(sys.argv[2]) if len(sys.argv) > 2 else 10000, sys.argv[3] if len(sys.argv) > 3 else None)
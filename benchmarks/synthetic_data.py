@@ -0,0 +1,95 @@
+"""Synthetic Rent the Runway-shaped review data for benchmarks.
+
+Writes gzipped JSONL with the schema of renttherunway_final_data.json.gz: string ids,
+ratings and ages, weight as "137lbs", height as 5' 8", bust size as "34d", review
+text and summary, and optional fields left out of a record the way the real data
+omits them. Users and items follow a Zipf-like popularity so partitions and user
+histories are skewed like real traffic.
+    python -m benchmarks.synthetic_data [out.json.gz] [rows] [seed]
+"""
+import gzip
+import json
+import sys
+import numpy as np
+
+OCCASIONS = ["wedding", "formal affair", "party", "everyday", "other", "work", "date", "vacation", "party: cocktail"]
+CATEGORIES = [
+    "dress", "gown", "sheath", "shift", "jumpsuit", "top", "maxi", "romper", "mini", "skirt", "jacket", "shirtdress",
+    "blouse", "sweater", "coat", "pants", "frock", "culottes", "leggings", "tunic", "trench", "bomber", "cape", "suit",
+]
+BODY_TYPES = ["hourglass", "athletic", "petite", "pear", "straight & narrow", "full bust", "apple"]
+FITS = ["fit", "small", "large"]
+CUPS = ["aa", "a", "b", "c", "d", "d+", "dd", "ddd/e", "f", "g", "h"]
+WORDS = (
+    "i love this dress fit perfectly true to size the fabric was great comfortable and flattering got so many "
+    "compliments wore it to a wedding party work event runs small large long short tight loose beautiful color "
+    "would rent again zipper was hard length was perfect with heels sleeves were snug stretchy lining itchy"
+).split()
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+# Share of records that leave out each optional field, close to the real data
+MISSING_RATES = {"bust size": 0.096, "weight": 0.156, "rating": 0.0004, "body type": 0.076, "height": 0.0035, "age": 0.005}
+
+
+def zipf_ids(rng, n_ids: int, size: int, first_id: int, exponent: float) -> np.ndarray:
+    """Ids drawn with probability proportional to 1 / rank**exponent, as a few items and users dominate real traffic."""
+    weights = 1.0 / np.arange(1, n_ids + 1) ** exponent
+    return first_id + rng.choice(n_ids, size=size, p=weights / weights.sum())
+
+
+def sentences(rng, n: int, low: int, high: int) -> list:
+    lengths = rng.integers(low, high, size=n)
+    words = np.array(WORDS)[rng.integers(len(WORDS), size=int(lengths.sum()))]
+    bounds = np.r_[0, np.cumsum(lengths)]
+    # Some capitals, punctuation and digits, so text cleaning has work to do
+    return [" ".join(words[start:stop]).capitalize() + ("!" if i % 3 else ". 10/10")
+            for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+
+def generate_records(n_rows: int, seed: int = 0, chunk_rows: int = 100000):
+    """Yield n_rows review records as dicts, generated chunk by chunk."""
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_rows // 2)
+    n_items = max(1, n_rows // 40)
+    for start in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - start)
+        columns = {
+            "fit": np.array(FITS)[rng.choice(3, size=n, p=[0.74, 0.13, 0.13])],
+            "user_id": zipf_ids(rng, n_users, n, 1000, 0.5).astype(str),
+            "bust size": [f"{band}{cup}" for band, cup in zip(rng.integers(30, 44, size=n), np.array(CUPS)[rng.integers(len(CUPS), size=n)])],
+            "item_id": zipf_ids(rng, n_items, n, 100000, 0.8).astype(str),
+            "weight": [f"{weight}lbs" for weight in rng.normal(137, 22, size=n).clip(90, 300).astype(int)],
+            "rating": rng.choice(["2", "4", "6", "8", "10"], size=n, p=[0.01, 0.02, 0.05, 0.28, 0.64]),
+            "rented for": np.array(OCCASIONS)[rng.integers(len(OCCASIONS), size=n)],
+            "review_text": sentences(rng, n, 5, 60),
+            "body type": np.array(BODY_TYPES)[rng.integers(len(BODY_TYPES), size=n)],
+            "review_summary": sentences(rng, n, 2, 8),
+            "category": np.array(CATEGORIES)[zipf_ids(rng, len(CATEGORIES), n, 0, 1.0)],
+            "height": [f"{inches // 12}' {inches % 12}\"" for inches in rng.normal(65, 3, size=n).clip(54, 78).astype(int)],
+            "size": rng.integers(0, 58, size=n),
+            "age": rng.normal(34, 8, size=n).clip(18, 80).astype(int).astype(str),
+            "review_date": [f"{MONTHS[month]} {day}, {year}" for month, day, year in
+                            zip(rng.integers(12, size=n), rng.integers(1, 29, size=n), rng.integers(2010, 2018, size=n))],
+        }
+        columns = {field: np.asarray(values).tolist() for field, values in columns.items()}
+        missing = {field: (rng.random(n) < rate).tolist() for field, rate in MISSING_RATES.items()}
+        for i in range(n):
+            record = {field: values[i] for field, values in columns.items()}
+            for field, is_missing in missing.items():
+                if is_missing[i]:
+                    del record[field]
+            yield record
+
+
+def write_jsonl(path: str, n_rows: int, seed: int = 0):
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for record in generate_records(n_rows, seed):
+            file.write(json.dumps(record))
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    out = sys.argv[1] if len(sys.argv) > 1 else "renttherunway_synthetic.json.gz"
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    write_jsonl(out, rows, int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    print(f"Wrote {rows} synthetic records to {out}")
@@ -1,15 +1,18 @@
-import pandas as pd
+import os
+import numpy as np
 from src.config import Config
+from src.storage import load_frame
 
 # Load interaction data
-interaction_df = pd.read_pickle(Config.USER_INTERACTIONS_FILE)
+interaction_df = load_frame(Config.USER_INTERACTIONS_FILE)
+feature_cols = [col for col in interaction_df.columns if not col.startswith("text_emb_")]
 
 # Check for NaN values
-print(interaction_df.iloc[:,:-383].info())
-print(interaction_df.iloc[:,:-383].head(10))
+print(interaction_df[feature_cols].info())
+print(interaction_df[feature_cols].head(10))
 nan_summary = interaction_df.isna().sum()
 #print columns
-print(interaction_df.columns[:-383])
+print(feature_cols)
 # Print summary of NaN values
 print("Summary of NaN values in each column:")
 print(nan_summary)
@@ -22,3 +25,8 @@ if nan_columns:
 else:
     print("\nNo NaN values detected.")
 
+# Text embeddings live in a separate memory-mapped matrix
+if os.path.exists(Config.EMBEDDINGS_FILE):
+    embeddings = np.load(Config.EMBEDDINGS_FILE, mmap_mode="r")
+    print(f"\nEmbeddings {embeddings.shape}: {int(np.isnan(embeddings).sum())} NaN values")
+
@@ -0,0 +1,38 @@
+import sys
+import tempfile
+import numpy as np
+from src.config import Config
+from src.recommendation import Recommender, SCORING_ENGINES, hit_rate_report
+
+# Compare the scoring engines on held-out rentals: one interaction of each sampled user
+# with several is hidden, and the engines, built on the rest, recommend in its partition:
+#   python engine_report.py [top_n] [n_users]
+top_n = int(sys.argv[1]) if len(sys.argv) > 1 else Config.NUM_RECOMMENDATIONS
+n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+recommender = Recommender()
+recommender.load_interactions()
+df = recommender.interaction_df
+
+rng = np.random.default_rng(0)
+counts = df["user_id"].value_counts()
+users = counts.index[counts >= 2].to_numpy()
+users = rng.choice(users, size=min(n_users, len(users)), replace=False)
+candidates = df[df["user_id"].isin(users)]
+held_out_rows = candidates.groupby("user_id").sample(n=1, random_state=0).index
+held_out = df.loc[held_out_rows]
+train = df.drop(index=held_out_rows)
+
+print(f"{len(held_out)} held-out rentals, top_n={top_n}, {len(train)} training interactions")
+print(f"{'engine':>8} {'hit rate':>9} {'coverage':>9} {'p50 ms':>8} {'p99 ms':>8}")
+with tempfile.TemporaryDirectory() as workdir:
+    for engine in SCORING_ENGINES:
+        # Artifacts built from the full data must not leak into the held-out evaluation
+        candidate = Recommender(item_profiles_file=f"{workdir}/item_profiles.pkl", vector_index_file=f"{workdir}/index.npz",
+                                engine=engine)
+        candidate.interaction_df = train
+        candidate.embeddings = recommender.embeddings
+        candidate.build_index()
+        candidate.result_cache.max_size = 0
+        report = hit_rate_report(candidate, held_out, top_n)
+        print(f"{engine:>8} {report['hit_rate']:>9.3f} {report['coverage']:>9.3f} {report['ms_p50']:>8.3f} {report['ms_p99']:>8.3f}")
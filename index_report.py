@@ -0,0 +1,37 @@
+import sys
+import numpy as np
+from src.config import Config
+from src.recommendation import Recommender
+from src.vector_index import build_index, recall_latency_report
+
+# Compare an approximate vector index against exact search on sampled user profiles:
+#   python index_report.py [ivf|faiss] [k] [n_queries]
+backend = sys.argv[1] if len(sys.argv) > 1 else "ivf"
+k = int(sys.argv[2]) if len(sys.argv) > 2 else Config.NUM_RECOMMENDATIONS
+n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+recommender = Recommender(index_backend="exact")
+recommender.load_interactions()
+exact_indexes = recommender.indexes
+
+rng = np.random.default_rng(0)
+queries = recommender.user_profiles[rng.choice(len(recommender.user_profiles), size=min(n_queries, len(recommender.user_profiles)), replace=False)]
+
+candidate_indexes = {
+    key: build_index(backend, index.blocks, index.offsets, index.inverse_norms)
+    for key, index in exact_indexes.items()
+}
+
+print(f"Backend: {backend}, k={k}, queries={len(queries)} per partition, partitions={len(exact_indexes)}")
+if backend == "ivf":
+    print(f"{'n_probe':>8} {'recall@k':>9} {'exact p50':>10} {'exact p99':>10} {'ivf p50':>9} {'ivf p99':>9}")
+    for n_probe in [1, 2, 4, 8, 16, 32]:
+        for index in candidate_indexes.values():
+            index.n_probe = n_probe
+        report = recall_latency_report(exact_indexes, candidate_indexes, queries, k)
+        print(f"{n_probe:>8} {report['recall_at_k']:>9.3f} {report['exact_ms_p50']:>10.3f} {report['exact_ms_p99']:>10.3f} "
+              f"{report['candidate_ms_p50']:>9.3f} {report['candidate_ms_p99']:>9.3f}")
+else:
+    report = recall_latency_report(exact_indexes, candidate_indexes, queries, k)
+    for name, value in report.items():
+        print(f"{name}: {value:.3f}")
@@ -3,23 +3,18 @@ from src.utils import LoggerFactory
 from src.data_ingestion import DataIngestion
 from src.data_processing import DataProcessor
 from src.recommendation import Recommender
+from src.recommendation_table import RecommendationTable
+from src.serving import ServingModel, GENERATION_POINTER
+from src.pipeline import PipelineRunner, Stage
+import logging
 import os
+import sys
 import pandas as pd
-from sentence_transformers import SentenceTransformer
 
-def main():
-    logger = LoggerFactory.create_logger()
+logger = logging.getLogger(__name__)
 
-    # Step 1: Data Ingestion
-    logger.info("Loading raw data...")
-    ingestion = DataIngestion()
-    df = ingestion.load_raw_data()
-
-    # Step 2: Data Processing
-    processor = DataProcessor()
-    logger.info("Cleaning and preprocessing data...")
-    df = processor.clean_data(df)
-    df = processor.feature_engineering(df)
+def build_interactions(processor: DataProcessor, *segments) -> dict:
+    df = pd.concat(segments, ignore_index=True)
 
     logger.info("Saving cleaned data...")
     processor.save_preprocessed_data(df)
@@ -30,64 +25,101 @@ def main():
     ]]
     df = processor.scale_features(df, numeric_cols_to_scale)
 
-    # Generate text embeddings for full_review if available
+    # Generate text embeddings for full_review if available; the embedding cache
+    # only encodes reviews it has not seen in an earlier run
     if "full_review" in df.columns:
         logger.info("Generating text embeddings using SentenceTransformer...")
-        model = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
-        embeddings = model.encode(df["full_review"].values, show_progress_bar=True)
-        emb_dim = embeddings.shape[1]
-        for i in range(emb_dim):
-            df[f"text_emb_{i}"] = embeddings[:, i]
-        logger.info(f"Text embeddings added: text_emb_0 to text_emb_{emb_dim-1}")
-
-    # df now represents user-item interactions after full processing
+        df = processor.order_interactions(df)
+        df = processor.generate_text_embeddings(df)
+        logger.info(f"Text embeddings saved to {Config.EMBEDDINGS_FILE}")
+
+    # df now represents user-item interactions after full processing; compact it once
+    # so loading and scoring never deal with wide dtypes
+    df = processor.finalize_interactions(df)
     processor.save_user_interactions(df)
+    return {"rows": len(df)}
 
+def build_recommendations(interactions: dict) -> dict:
     # Step 3: Generate recommendations for all user-category-occasion combos
     recommender = Recommender()
     logger.info("Loading user interactions for recommendations...")
     recommender.load_interactions()
 
+    if recommender.item_profiles is not None:
+        logger.info("Saving item profiles...")
+        recommender.save_item_profiles(recommender.item_profiles)
+
+    logger.info("Saving vector indexes...")
+    recommender.save_vector_indexes()
+
+    logger.info("Saving the serving model...")
+    ServingModel().save(recommender)
+
     interaction_df = recommender.interaction_df
     if interaction_df is None or interaction_df.empty:
         logger.error("No interaction data available for recommendation.")
-        return
+        return {"rows": 0}
 
     users = interaction_df["user_id"].unique()
-    categories = interaction_df["category"].unique()
-    occasions = interaction_df["rented for"].unique()
-
-    logger.info("Generating top 3 recommendations for each user-category-occasion combination...")
-
-    results = []
-    for user_id in ["9","25"]:
-        for category in categories:
-            for occasion in occasions:
-                recommendations = recommender.recommend_items(user_id, occasion, category, top_n=3)
-                if recommendations.empty:
-                    continue
-                else:
-                    for _, row in recommendations.iterrows():
-                        results.append({
-                            "user_id": user_id,
-                            "category": category,
-                            "occasion": occasion,
-                            "item_id": row["item_id"],
-                            "average_rating": row["average_rating"],
-                            "review_count": row["review_count"]
-                        })
-
-    if not results:
+
+    # As many as requests get by default, so those are all answered from the precomputed table
+    logger.info(f"Generating top {Config.NUM_RECOMMENDATIONS} recommendations for each user-category-occasion combination...")
+
+    results_df = recommender.recommend_batch(users, top_n=Config.NUM_RECOMMENDATIONS)
+
+    if results_df.empty:
         logger.warning("No recommendations found for any combination.")
-        return
+        return {"rows": 0}
 
-    results_df = pd.DataFrame(results)
     os.makedirs(Config.PROCESSED_DATA_DIR, exist_ok=True)
-    output_file = os.path.join(Config.PROCESSED_DATA_DIR, "user_recommendation.pkl")
-    results_df.to_pickle(output_file)
+    recommender.save_recommendations(results_df)
+    RecommendationTable().save(results_df)
 
-    logger.info(f"Recommendations saved successfully to {output_file}!")
+    logger.info(f"Recommendations saved successfully to {Config.RECOMMENDATION_FILE}!")
+    return {"rows": len(results_df)}
 
-if __name__ == "__main__":
-    main()
+def main(force: bool = False):
+    LoggerFactory.create_logger()
+    runner = PipelineRunner(force=force)
+    os.makedirs(runner.checkpoint_dir, exist_ok=True)
 
+    # Step 1: Data Ingestion. The raw file is split into content-hashed segments, each one
+    # streamed Config.INGESTION_CHUNKSIZE records at a time, so records appended since the
+    # last run are the only ones transformed again
+    ingestion = DataIngestion()
+    processor = DataProcessor()
+    segments = ingestion.update_segments(os.path.join(runner.checkpoint_dir, "raw_segments.json"))
+    logger.info(f"Raw data in {len(segments)} segment(s)")
+
+    # Step 2: Data Processing. Global statistics (imputation values, categories, label
+    # classes) are refit in one streaming pass over every segment; a segment is only
+    # transformed again when its records or the statistics it uses change
+    stats = runner.add(Stage("fit_stats", lambda: processor.fit_chunks(ingestion.iter_segments(segments)),
+                             params=segments, content_key=True))
+    transformed = []
+    for segment in segments:
+        missing = runner.add(Stage(f"missing_{segment['sha256']}", lambda segment=segment: processor.missing_values(ingestion.load_segment(segment)),
+                                   params=segment))
+        segment_stats = runner.add(Stage(f"stats_{segment['sha256']}", processor.chunk_stats, [missing, stats], content_key=True))
+        transformed.append(runner.add(Stage(f"transform_{segment['sha256']}",
+                                            lambda fit, segment=segment: processor.transform_chunks(ingestion.load_segment(segment), fit),
+                                            [segment_stats], params=segment)))
+
+    interactions = runner.add(Stage(
+        "interactions", lambda *chunks: build_interactions(processor, *chunks), transformed,
+        params=[Config.STORAGE_FORMAT, Config.EMBEDDING_MODEL_NAME, Config.EMBEDDING_DTYPE],
+        outputs=[Config.CLEANED_DATA_FILE, Config.USER_INTERACTIONS_FILE, Config.EMBEDDINGS_FILE],
+    ))
+    recommendations = runner.add(Stage(
+        "recommendations", build_recommendations, [interactions],
+        params=[Config.SCORING_ENGINE, Config.ITEM_AGGREGATION, Config.VECTOR_INDEX_BACKEND, Config.NUM_RECOMMENDATIONS],
+        outputs=[os.path.join(Config.SERVING_MODEL_DIR, GENERATION_POINTER), Config.RECOMMENDATION_FILE,
+                 os.path.join(Config.RECOMMENDATION_TABLE_DIR, GENERATION_POINTER)],
+    ))
+
+    runner.run(recommendations)
+    logger.info(f"Stages run: {', '.join(runner.ran) or 'none, everything was up to date'}")
+
+if __name__ == "__main__":
+    # --force reruns every stage, e.g. after changing the processing code
+    main(force="--force" in sys.argv[1:])
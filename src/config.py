@@ -8,11 +8,88 @@ class Config:
     PREPROCESSED_DATA_DIR = os.path.join(DATA_DIR, "preprocessed")
     PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
 
+    # Format of the DataFrame artifacts: "pickle", or "parquet" (columnar, requires pyarrow)
+    # so that readers can load only the columns and partitions they need
+    STORAGE_FORMAT = "pickle"
+    FRAME_EXTENSION = ".parquet" if STORAGE_FORMAT == "parquet" else ".pkl"
+    # Upper bound on rows per Parquet row group; every partition starts a new row group
+    PARQUET_ROW_GROUP_SIZE = 131072
+
     RAW_DATA_FILE = os.path.join(RAW_DATA_DIR, "renttherunway_final_data.json.gz")
-    CLEANED_DATA_FILE = os.path.join(PREPROCESSED_DATA_DIR, "cleaned_data.pkl")
-    USER_INTERACTIONS_FILE = os.path.join(PREPROCESSED_DATA_DIR, "user_item_interactions.pkl")
-    RECOMMENDATION_FILE = os.path.join(PROCESSED_DATA_DIR, "user_recommendation.pkl")
+    CLEANED_DATA_FILE = os.path.join(PREPROCESSED_DATA_DIR, "cleaned_data" + FRAME_EXTENSION)
+    USER_INTERACTIONS_FILE = os.path.join(PREPROCESSED_DATA_DIR, "user_item_interactions" + FRAME_EXTENSION)
+    # Text embeddings: one row per interaction, aligned through its embedding_row column
+    EMBEDDINGS_FILE = os.path.join(PREPROCESSED_DATA_DIR, "text_embeddings.npy")
+    # Embeddings of previously encoded texts, reused across pipeline runs
+    EMBEDDING_CACHE_FILE = os.path.join(PREPROCESSED_DATA_DIR, "embedding_cache.sqlite")
+    ITEM_PROFILES_FILE = os.path.join(PREPROCESSED_DATA_DIR, "item_profiles.pkl")
+    VECTOR_INDEX_FILE = os.path.join(PREPROCESSED_DATA_DIR, "user_item_interactions_index.npz")
+    RECOMMENDATION_FILE = os.path.join(PROCESSED_DATA_DIR, "user_recommendation" + FRAME_EXTENSION)
+    # Compact NumPy artifacts the web app maps read-only instead of loading the DataFrames, so
+    # all its worker processes share one copy. main.py publishes every run as a new generation
+    # of these directories and workers switch to it on their next request
+    SERVING_MODEL_DIR = os.path.join(PREPROCESSED_DATA_DIR, "serving_model")
+    RECOMMENDATION_TABLE_DIR = os.path.join(PROCESSED_DATA_DIR, "user_recommendation_table")
+    # Generations kept per artifact directory; workers still mapping a deleted one are unaffected
+    SERVING_GENERATIONS_KEPT = 2
+    # Stage checkpoints of main.py's pipeline; a stage reruns only when its inputs change
+    CHECKPOINT_DIR = os.path.join(PREPROCESSED_DATA_DIR, "checkpoints")
+
+    # Records per chunk when streaming the raw data; None reads each segment of the file at once
+    INGESTION_CHUNKSIZE = None
+    # Worker processes for review text cleaning, streamed chunk transforms and text encoding; -1 uses every core
+    N_JOBS = 1
+    # Frames smaller than this are processed serially, as shipping shards to workers costs more than it saves
+    PARALLEL_MIN_ROWS = 20000
 
     EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+    # "float16" halves the embeddings file and page cache footprint at some scoring cost
+    EMBEDDING_DTYPE = "float32"
+    EMBEDDING_BATCH_SIZE = 64
+    # Texts encoded between writes to the embedding cache
+    EMBEDDING_CACHE_CHUNK = 4096
+    # Recommendations main.py precomputes per user-category-occasion combination, and the
+    # default top_n of requests, so default requests are answered from the table
     NUM_RECOMMENDATIONS = 5
+    # How review rows are scored per item: "mean" and "weighted_mean" (by rating) score
+    # one aggregated profile per item, "max" scores every review and keeps the best
+    ITEM_AGGREGATION = "mean"
+    # Users scored per matrix multiplication in Recommender.recommend_batch
+    BATCH_BLOCK_SIZE = 512
+    # "precomputed" serves the web app from RECOMMENDATION_TABLE_DIR, computing live only for
+    # missing entries or a larger top_n; "live" always computes
+    SERVING_MODE = "precomputed"
+    # Concurrent /api/recommend requests computed live are scored together: a request with
+    # others queued behind it waits until the batch holds MICRO_BATCH_MAX_SIZE requests or
+    # MICRO_BATCH_MAX_WAIT_MS have passed, a lone request is scored at once
+    MICRO_BATCH_MAX_SIZE = 64
+    MICRO_BATCH_MAX_WAIT_MS = 2
+    # Largest top_n a request may ask for; larger values are capped
+    MAX_RECOMMENDATIONS = 100
+    # Turns on debug logging, including per-request stage timings, and the NaN diagnostics
+    # over the similarity features; off by default as they cost time on every load
+    DEBUG_DIAGNOSTICS = False
+    # Upper bounds, in seconds, of the stage latency histograms served at /metrics
+    METRICS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+    # In-memory caches of recommend_items results and per-partition item data; both are
+    # cleared when the interactions file changes. A size of 0 disables a cache
+    RESULT_CACHE_SIZE = 10000
+    RESULT_CACHE_TTL = None  # seconds; None keeps results until evicted or invalidated
+    PARTITION_CACHE_SIZE = 1024
+
+
+    # Scoring engine: "content" (cosine over review features and text embeddings, searched
+    # with VECTOR_INDEX_BACKEND) or "item_cf" (item-item collaborative filtering on co-rentals)
+    SCORING_ENGINE = "content"
+    # Most similar items the item_cf engine keeps per item and partition
+    ITEM_CF_NEIGHBOURS = 50
 
+    # Vector index used for scoring: "exact" (brute force), "ivf" (NumPy inverted file)
+    # or "faiss" (HNSW graph, requires faiss)
+    VECTOR_INDEX_BACKEND = "exact"
+    IVF_N_LISTS = None  # per partition; defaults to sqrt(rows)
+    IVF_N_PROBE = 8
+    IVF_TRAIN_ITERATIONS = 10
+    HNSW_M = 32
+    # Rows fetched per requested item when several rows can belong to one item
+    VECTOR_INDEX_OVERSAMPLE = 4
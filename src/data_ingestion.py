@@ -1,7 +1,23 @@
 import pandas as pd
+import gzip
+import hashlib
+import io
+import json
 import os
 from .config import Config
 
+# Explicit dtypes for the raw Rent the Runway records; ids and numeric fields are
+# read as float64 since any of them can be missing
+RAW_DTYPES = {
+    "user_id": "float64",
+    "item_id": "float64",
+    "rating": "float64",
+    "size": "float64",
+    "age": "float64",
+}
+CATEGORICAL_COLUMNS = ["category", "rented for", "body type"]
+HASH_BLOCK_BYTES = 1 << 20
+
 class DataIngestion:
     def __init__(self, raw_data_file: str = Config.RAW_DATA_FILE):
         self.raw_data_file = raw_data_file
@@ -12,7 +28,100 @@ class DataIngestion:
         df = pd.read_json(self.raw_data_file, lines=True)
         return df
 
+    def iter_raw_data(self, chunksize: int = Config.INGESTION_CHUNKSIZE):
+        """Stream the raw JSONL file in chunks of chunksize records with explicit dtypes; None yields it as one chunk."""
+        if not os.path.exists(self.raw_data_file):
+            raise FileNotFoundError(f"Data file not found at {self.raw_data_file}")
+        reader = pd.read_json(self.raw_data_file, lines=True, chunksize=chunksize, dtype=self.raw_dtypes())
+        if chunksize is None:
+            yield reader
+            return
+        with reader:
+            for chunk in reader:
+                yield chunk
+
+    @staticmethod
+    def raw_dtypes() -> dict:
+        return dict(RAW_DTYPES, **{col: "category" for col in CATEGORICAL_COLUMNS})
+
+    def update_segments(self, manifest_file: str) -> list:
+        """Split the raw file into content-hashed byte ranges, keeping the ones recorded in manifest_file.
+
+        Records appended to the file (as a new gzip member, for .gz files) become one
+        new segment, so only they need processing; any other change to the file
+        starts over with a single segment.
+        """
+        if not os.path.exists(self.raw_data_file):
+            raise FileNotFoundError(f"Data file not found at {self.raw_data_file}")
+        previous = []
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as file:
+                previous = json.load(file)
+
+        size = os.path.getsize(self.raw_data_file)
+        segments, start = [], 0
+        for segment in previous:
+            if segment["start"] != start or segment["end"] > size or self._hash_range(start, segment["end"]) != segment["sha256"]:
+                segments, start = [], 0
+                break
+            segments.append(segment)
+            start = segment["end"]
+        if start < size:
+            segments.append({"start": start, "end": size, "sha256": self._hash_range(start, size)})
+
+        with open(manifest_file, "w") as file:
+            json.dump(segments, file)
+        return segments
+
+    def _hash_range(self, start: int, end: int) -> str:
+        digest = hashlib.sha256()
+        with open(self.raw_data_file, "rb") as file:
+            file.seek(start)
+            while start < end:
+                block = file.read(min(HASH_BLOCK_BYTES, end - start))
+                if not block:
+                    break
+                digest.update(block)
+                start += len(block)
+        return digest.hexdigest()[:32]
+
+    def load_segment(self, segment: dict, chunksize: int = Config.INGESTION_CHUNKSIZE):
+        """Stream the records of one byte range of the raw file in chunks of chunksize records, like iter_raw_data."""
+        with open(self.raw_data_file, "rb") as file:
+            file.seek(segment["start"])
+            stream = io.BufferedReader(ByteRange(file, segment["end"] - segment["start"]))
+            if self.raw_data_file.endswith(".gz"):
+                stream = gzip.GzipFile(fileobj=stream)
+            reader = pd.read_json(stream, lines=True, dtype=self.raw_dtypes(), chunksize=chunksize)
+            if chunksize is None:
+                yield reader
+                return
+            with reader:
+                for chunk in reader:
+                    yield chunk
+
+    def iter_segments(self, segments: list, chunksize: int = Config.INGESTION_CHUNKSIZE):
+        """Stream the records of several segments, in order, in chunks of chunksize records."""
+        for segment in segments:
+            yield from self.load_segment(segment, chunksize)
+
     @staticmethod
     def save_data(df: pd.DataFrame, filepath: str):
         df.to_pickle(filepath)
 
+
+class ByteRange(io.RawIOBase):
+    """Read-only stream of the next length bytes of an open binary file."""
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
@@ -1,14 +1,31 @@
+import copy
+import itertools
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import MinMaxScaler, LabelEncoder
 from .config import Config
+from .data_ingestion import CATEGORICAL_COLUMNS
 from .utils import TextCleaner
+from .embedding_cache import EmbeddingCache
+from .storage import save_frame
+
+LABEL_ENCODED_COLUMNS = ["body type", "rented for", "category"]
+# Narrowed by finalize_interactions: ids to integers, repeated strings to categoricals
+ID_COLUMNS = ["user_id", "item_id", "embedding_row"]
+CATEGORY_COLUMNS = CATEGORICAL_COLUMNS + ["fit", "bust size", "bust_cup"]
 
 class DataProcessor:
-    def __init__(self, cleaned_data_file: str = Config.CLEANED_DATA_FILE, user_interactions_file: str = Config.USER_INTERACTIONS_FILE):
+    def __init__(self, cleaned_data_file: str = Config.CLEANED_DATA_FILE, user_interactions_file: str = Config.USER_INTERACTIONS_FILE,
+                 embeddings_file: str = Config.EMBEDDINGS_FILE, embedding_cache_file: str = Config.EMBEDDING_CACHE_FILE,
+                 n_jobs: int = Config.N_JOBS):
         self.cleaned_data_file = cleaned_data_file
         self.user_interactions_file = user_interactions_file
+        self.embeddings_file = embeddings_file
+        self.embedding_cache_file = embedding_cache_file
+        self.n_jobs = n_jobs
+        self.embedding_model = None
 
     def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         # Drop columns with >50% missing data
@@ -28,11 +45,133 @@ class DataProcessor:
 
         # Text cleaning
         if "review_text" in df.columns:
-            df["review_text"] = df["review_text"].fillna("").apply(TextCleaner.clean_text)
+            df["review_text"] = self._map_shards(TextCleaner.clean_text_series, df["review_text"].fillna(""))
 
         return df
 
-    def feature_engineering(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _map_shards(self, func, data):
+        """Apply a row-local func to contiguous shards of data in worker processes and concatenate the results in order."""
+        n_jobs = effective_n_jobs(self.n_jobs)
+        if n_jobs == 1 or len(data) < Config.PARALLEL_MIN_ROWS:
+            return func(data)
+        bounds = np.linspace(0, len(data), n_jobs + 1).astype(int)
+        shards = Parallel(n_jobs=n_jobs)(delayed(func)(data.iloc[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:]))
+        return pd.concat(shards)
+
+    def fit_chunks(self, chunks) -> dict:
+        """First streaming pass: collect the global statistics clean_data and feature_engineering need."""
+        columns, numeric = [], {}
+        n_rows, non_null, value_counts = 0, {}, {}
+        for chunk in chunks:
+            n_rows += len(chunk)
+            for col in chunk.columns:
+                if col not in numeric:
+                    columns.append(col)
+                    numeric[col] = True
+                numeric[col] &= pd.api.types.is_numeric_dtype(chunk[col])
+                non_null[col] = non_null.get(col, 0) + int(chunk[col].notna().sum())
+
+                counts = chunk[col].value_counts()
+                counts = counts[counts > 0]
+                counts.index = counts.index.astype(object)
+                value_counts[col] = counts if col not in value_counts else value_counts[col].add(counts, fill_value=0)
+
+        # Same rules as clean_data: drop columns with >50% missing data, impute the
+        # median for numeric columns and the most frequent value for the rest
+        keep = [col for col in columns if non_null[col] >= n_rows * 0.5]
+        fill_values = {}
+        for col in keep:
+            counts = value_counts[col]
+            if numeric[col]:
+                counts = counts.sort_index()
+                positions = np.cumsum(counts.to_numpy())
+                middle = [(non_null[col] - 1) // 2, non_null[col] // 2]
+                fill_values[col] = float(np.mean(counts.index[np.searchsorted(positions, middle, side="right")]))
+            else:
+                fill_values[col] = min(counts[counts == counts.max()].index)
+
+        categorical = [col for col in keep if not numeric[col] and col in CATEGORICAL_COLUMNS]
+        return {
+            "columns": keep,
+            "numeric_columns": [col for col in keep if numeric[col]],
+            "fill_values": fill_values,
+            "categories": {col: sorted(value_counts[col].index) for col in categorical},
+            "label_classes": {col: sorted(str(value) for value in value_counts[col].index) for col in LABEL_ENCODED_COLUMNS if col in keep},
+        }
+
+    @staticmethod
+    def missing_values(chunks) -> dict:
+        """Columns the chunks' records have, and those of them missing in any record, as chunk_stats needs them."""
+        columns, everywhere, missing = set(), None, set()
+        for chunk in chunks:
+            columns.update(chunk.columns)
+            everywhere = set(chunk.columns) if everywhere is None else everywhere & set(chunk.columns)
+            missing.update(col for col in chunk.columns if chunk[col].isna().any())
+        missing.update(columns - (everywhere or set()))
+        return {"columns": sorted(columns), "missing": sorted(missing)}
+
+    @staticmethod
+    def chunk_stats(missing: dict, stats: dict) -> dict:
+        """The part of stats transform_chunk uses for some chunks: fill values only of the columns they are missing values in."""
+        columns = [col for col in stats["columns"] if col not in missing["columns"] or col in missing["missing"]]
+        return dict(stats, fill_values={col: stats["fill_values"][col] for col in columns})
+
+    def transform_chunk(self, chunk: pd.DataFrame, stats: dict) -> pd.DataFrame:
+        """Second streaming pass: clean and engineer features for one chunk using global statistics."""
+        chunk = chunk.reindex(columns=stats["columns"])
+        for col, categories in stats["categories"].items():
+            chunk[col] = chunk[col].astype(pd.CategoricalDtype(categories))
+        chunk = chunk.fillna(stats["fill_values"])
+        chunk[stats["numeric_columns"]] = chunk[stats["numeric_columns"]].astype("float64")
+
+        # Text cleaning
+        if "review_text" in chunk.columns:
+            chunk["review_text"] = self._map_shards(TextCleaner.clean_text_series, chunk["review_text"].fillna(""))
+
+        return self.feature_engineering(chunk, label_classes=stats["label_classes"])
+
+    def transform_chunks(self, chunks, stats: dict) -> pd.DataFrame:
+        """Transform a chunk iterator with transform_chunk and concatenate the results in reading order."""
+        chunks = iter(chunks)
+        head = list(itertools.islice(chunks, 2))
+        if len(head) < 2 or effective_n_jobs(self.n_jobs) == 1:
+            # A single chunk is transformed here, with its text cleaning sharded over the workers
+            return pd.concat((self.transform_chunk(chunk, stats) for chunk in itertools.chain(head, chunks)), ignore_index=True)
+
+        # Chunks are already shards: transform them in worker processes, each one serially.
+        # Chunks are read as workers free up, so only a few are in memory at a time
+        worker = copy.copy(self)
+        worker.n_jobs = 1
+        transformed = Parallel(n_jobs=self.n_jobs, return_as="generator")(
+            delayed(worker.transform_chunk)(chunk, stats) for chunk in itertools.chain(head, chunks)
+        )
+        return pd.concat(transformed, ignore_index=True)
+
+    def process_chunks(self, chunk_source) -> pd.DataFrame:
+        """Clean and engineer features chunk by chunk; chunk_source() must return a fresh chunk iterator."""
+        return self.transform_chunks(chunk_source(), self.fit_chunks(chunk_source()))
+
+    def feature_engineering(self, df: pd.DataFrame, label_classes: dict = None) -> pd.DataFrame:
+        # Serial: measurements are parsed once per distinct value, so shipping the frame,
+        # review texts included, to worker processes costs more than the work itself
+        df = self.row_features(df)
+
+        # Label encode categorical features if present
+        categorical_features = [feature for feature in LABEL_ENCODED_COLUMNS if feature in df.columns]
+
+        for feature in categorical_features:
+            if label_classes is not None and feature in label_classes:
+                # Classes collected over the whole dataset, so chunks share one encoding
+                codes = pd.Categorical(df[feature].astype(str), categories=label_classes[feature]).codes
+                df[f"{feature}_encoded"] = codes.astype("int64")
+            else:
+                le = LabelEncoder()
+                df[f"{feature}_encoded"] = le.fit_transform(df[feature].astype(str))
+
+        return df
+
+    def row_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Features computed from each row alone."""
         # Create full_review
         if "review_text" in df.columns and "review_summary" in df.columns:
             df["full_review"] = (df["review_summary"].fillna("") + " " + df["review_text"].fillna("")).str.strip()
@@ -43,75 +182,158 @@ class DataProcessor:
             df["fit_encoded"] = df["fit"].map(fit_mapping)
 
 
-        # Parse weight
+        # Parse weight, height and bust size, and compute BMI
+        df = self.parse_measurements(df)
+
+        # Encode bust cup
+        if "bust size" in df.columns:
+            cup_map = {"aa":0.5,"a":1,"b":2,"c":3,"d":4,"dd":5,"ddd":6,"f":7}
+            df["bust_cup_encoded"] = df["bust_cup"].map(cup_map)
+      
+        # Fill missing values for encoded columns
+        if "bust_cup_encoded" in df.columns:
+            df["bust_cup_encoded"] = df["bust_cup_encoded"].fillna(0)  # Default to 0 if no cup size
+
+        return df
+
+    def order_interactions(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Group rows by (occasion, category, item) so every recommendation partition
+        # is a contiguous block of rows, and of the embedding matrix written after it
+        keys = [key for key in ["rented for", "category", "item_id"] if key in df.columns]
+        return df.sort_values(keys, kind="stable").reset_index(drop=True)
+
+    def parse_measurements(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Measurements repeat heavily (a few hundred distinct strings), so each
+        # distinct value is parsed once and the results are mapped back to the rows
         if "weight" in df.columns:
-            df["weight"] = df["weight"].astype(str).str.replace("lbs", "", regex=False).str.strip()
-            df["weight"] = pd.to_numeric(df["weight"], errors="coerce")
+            df["weight"] = self._map_distinct(df["weight"], self._parse_weight)
 
-        # Parse height
         if "height" in df.columns:
-            def convert_height(h):
-                if pd.isna(h):
-                    return np.nan
-                parts = h.split("'")
-                if len(parts) == 2:
-                    feet = parts[0]
-                    inches = parts[1].replace('"', '').strip()
-                    if feet.isdigit() and inches.isdigit():
-                        return int(feet)*12 + int(inches)
-                return np.nan
-            df["height"] = df["height"].apply(convert_height)
+            df["height"] = self._map_distinct(df["height"], self._parse_height)
 
         # Compute BMI
         if "height" in df.columns and "weight" in df.columns:
             df["BMI"] = np.where((df["height"]>0) & (df["weight"]>0), (df["weight"] / (df["height"]**2))*703, np.nan)
 
-        # Parse bust size
         if "bust size" in df.columns:
-            df["bust_band"] = pd.to_numeric(df["bust size"].str.extract(r"(\d+)", expand=False), errors='coerce')
-            df["bust_cup"] = df["bust size"].str.extract(r"([A-Za-z]+)[^A-Za-z]*$", expand=False).str.lower()
+            bust = self._map_distinct(df["bust size"], self._parse_bust_size)
+            df["bust_band"] = bust["bust_band"]
+            df["bust_cup"] = bust["bust_cup"]
 
-            cup_map = {"aa":0.5,"a":1,"b":2,"c":3,"d":4,"dd":5,"ddd":6,"f":7}
-            df["bust_cup_encoded"] = df["bust_cup"].map(cup_map)
-      
-        # Fill missing values for encoded columns
-        if "bust_cup_encoded" in df.columns:
-            df["bust_cup_encoded"] = df["bust_cup_encoded"].fillna(0)  # Default to 0 if no cup size
-  
-        # Label encode categorical features if present
-        categorical_features = []
-        if "body type" in df.columns:
-            categorical_features.append("body type")
-        if "rented for" in df.columns:
-            categorical_features.append("rented for")
-        if "category" in df.columns:
-            categorical_features.append("category")
+        return df
 
-        for feature in categorical_features:
-            le = LabelEncoder()
-            df[f"{feature}_encoded"] = le.fit_transform(df[feature].astype(str))
+    @staticmethod
+    def _map_distinct(values: pd.Series, parse):
+        """Apply a vectorized parser to the distinct values of a column and map the results back."""
+        codes, distinct = pd.factorize(values, use_na_sentinel=False)
+        parsed = parse(pd.Series(distinct, dtype=object))
+        return parsed.iloc[codes].set_axis(values.index)
 
-        return df
+    @staticmethod
+    def _parse_weight(weights: pd.Series) -> pd.Series:
+        # "137lbs" -> 137
+        weights = weights.astype(str).str.replace("lbs", "", regex=False).str.strip()
+        return pd.to_numeric(weights, errors="coerce")
+
+    @staticmethod
+    def _parse_height(heights: pd.Series) -> pd.Series:
+        # 5' 6" -> 66 inches, NaN unless both parts are plain numbers. \d also matches
+        # non-ASCII digits such as "６", which pd.to_numeric rejects but int() parses
+        parts = heights.str.extract(r"^(\d+)'([^']*)$")
+        inches = parts[1].str.replace('"', '', regex=False).str.strip()
+        valid = inches.str.fullmatch(r"\d+", na=False)
+        feet = parts[0].where(valid).map(int, na_action="ignore").astype("float64")
+        height = feet * 12 + inches.where(valid).map(int, na_action="ignore").astype("float64")
+        return height if height.isna().any() else height.astype("int64")
+
+    @staticmethod
+    def _parse_bust_size(sizes: pd.Series) -> pd.DataFrame:
+        # "34dd" -> band 34, cup "dd"
+        return pd.DataFrame({
+            "bust_band": pd.to_numeric(sizes.str.extract(r"(\d+)", expand=False), errors='coerce'),
+            "bust_cup": sizes.str.extract(r"([A-Za-z]+)[^A-Za-z]*$", expand=False).str.lower(),
+        })
 
     def generate_text_embeddings(self, df: pd.DataFrame) -> pd.DataFrame:
         if "full_review" in df.columns:
-            print("Generating text embeddings...")
-            embeddings = self.embedding_model.encode(df["full_review"].fillna("").values, show_progress_bar=True)
-            emb_dim = embeddings.shape[1]
-            for i in range(emb_dim):
-                df[f"text_emb_{i}"] = embeddings[:, i]
-            print(f"Text embeddings added as columns: text_emb_0 to text_emb_{emb_dim-1}")
+            texts = df["full_review"].fillna("").tolist()
+            cache = EmbeddingCache(self.embedding_cache_file, Config.EMBEDDING_MODEL_NAME)
+            keys = [cache.key(text) for text in texts]
+
+            # Only distinct texts the cache has not seen yet are encoded
+            distinct = dict(zip(keys, texts))
+            vectors = cache.get_many(list(distinct))
+            print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate:.1%} hit rate)")
+            missing = [key for key in distinct if key not in vectors]
+            if missing:
+                vectors.update(self.encode_texts(cache, missing, distinct))
+            cache.close()
+            embeddings = np.stack([vectors[key] for key in keys])
+
+            # Store embeddings as one matrix outside the DataFrame; embedding_row aligns rows with it
+            np.save(self.embeddings_file, embeddings.astype(Config.EMBEDDING_DTYPE))
+            df["embedding_row"] = np.arange(len(df))
+            print(f"Text embeddings saved to {self.embeddings_file} with shape {embeddings.shape}")
         return df
 
+    def encode_texts(self, cache: EmbeddingCache, keys: list, texts: dict) -> dict:
+        if self.embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
+
+        # Longest texts first so every batch pads to similar lengths; each chunk is
+        # written to the cache as soon as it is encoded so interrupted runs keep their progress
+        keys = sorted(keys, key=lambda key: len(texts[key]), reverse=True)
+        vectors = {}
+        print(f"Generating text embeddings for {len(keys)} new texts...")
+
+        # With several workers, batches are spread over a pool of encoding processes
+        n_workers = effective_n_jobs(self.n_jobs)
+        pool = self.embedding_model.start_multi_process_pool(["cpu"] * n_workers) if n_workers > 1 else None
+        try:
+            for start in range(0, len(keys), Config.EMBEDDING_CACHE_CHUNK):
+                chunk = keys[start:start + Config.EMBEDDING_CACHE_CHUNK]
+                batch = [texts[key] for key in chunk]
+                if pool is None:
+                    embeddings = self.embedding_model.encode(batch, batch_size=Config.EMBEDDING_BATCH_SIZE)
+                else:
+                    embeddings = self.embedding_model.encode_multi_process(batch, pool, batch_size=Config.EMBEDDING_BATCH_SIZE)
+                cache.put_many(chunk, embeddings)
+                vectors.update(zip(chunk, np.asarray(embeddings, dtype=np.float32)))
+                print(f"Encoded {min(start + len(chunk), len(keys))}/{len(keys)} texts")
+        finally:
+            if pool is not None:
+                self.embedding_model.stop_multi_process_pool(pool)
+        return vectors
+
     def scale_features(self, df: pd.DataFrame, cols: list) -> pd.DataFrame:
         if len(cols) > 0:
             scaler = MinMaxScaler()
             df[cols] = scaler.fit_transform(df[cols])
         return df
 
+    def finalize_interactions(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Compact the interactions frame once, offline: narrow dtypes and categorical strings."""
+        for col in df.columns:
+            if col in ID_COLUMNS:
+                # Integer ids, so lookups and groupings compare ints instead of floats
+                df[col] = df[col].astype(np.int32 if df[col].max() < np.iinfo(np.int32).max else np.int64)
+            elif col in CATEGORY_COLUMNS:
+                df[col] = df[col].astype("category")
+            elif pd.api.types.is_numeric_dtype(df[col]) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                # Missing features stay NaN: user and item means skip them, and the Recommender
+                # fills NaN means with 0 once, when it builds the profiles
+                values = df[col]
+                if col.endswith("_encoded") and values.notna().all() and (values % 1 == 0).all():
+                    df[col] = pd.to_numeric(values, downcast="integer")
+                else:
+                    df[col] = values.astype(np.float32)
+        return df
+
     def save_preprocessed_data(self, df: pd.DataFrame):
-        df.to_pickle(self.cleaned_data_file)
+        save_frame(df, self.cleaned_data_file)
 
     def save_user_interactions(self, df: pd.DataFrame):
-        df.to_pickle(self.user_interactions_file)
+        # Partitioned like the recommender's (occasion, category) partitions
+        save_frame(df, self.user_interactions_file, partition_cols=["rented for", "category"])
 
@@ -0,0 +1,50 @@
+import hashlib
+import sqlite3
+import numpy as np
+from .config import Config
+
+class EmbeddingCache:
+    """Persistent text embedding cache in SQLite, keyed by a hash of the model name and the text."""
+
+    # SQLite limits the number of bound parameters per statement
+    LOOKUP_BATCH = 500
+
+    def __init__(self, cache_file: str = Config.EMBEDDING_CACHE_FILE, model_name: str = Config.EMBEDDING_MODEL_NAME):
+        self.cache_file = cache_file
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: vector} for the keys present in the cache and update the hit/miss counters."""
+        found = {}
+        for start in range(0, len(keys), self.LOOKUP_BATCH):
+            batch = keys[start:start + self.LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: list, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((key, vector.tobytes()) for key, vector in zip(keys, vectors)),
+            )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.connection.close()
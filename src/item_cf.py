@@ -0,0 +1,120 @@
+import numpy as np
+from .vector_index import top_k
+
+# Item-item collaborative filtering. Scoring only needs NumPy; scipy is imported
+# solely to build the similarities offline
+
+
+class SparseRows:
+    """Rows of a CSR matrix as plain arrays; indexing with a list of rows returns their sub-matrix."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, rows) -> "SparseRows":
+        rows = np.asarray(rows)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        positions = concatenated_ranges(starts, lengths)
+        return SparseRows(np.r_[0, np.cumsum(lengths)], self.indices[positions], self.data[positions])
+
+    def to_arrays(self) -> dict:
+        return {"indptr": self.indptr, "indices": self.indices, "data": self.data}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "SparseRows":
+        return cls(arrays["indptr"], arrays["indices"], arrays["data"])
+
+
+class ItemNeighbourIndex:
+    """Scores one partition's items for users given as weighted sets of the items they rented.
+
+    For every item, stores its most similar items within the partition; a user's
+    score for an item is the weighted sum of its similarity to the user's items.
+    Items no neighbour reaches are never returned, so a search can return fewer
+    than k groups (padded with -1), like the vector indexes.
+    """
+    backend = "item_cf"
+
+    def __init__(self, indptr: np.ndarray, neighbours: np.ndarray, similarities: np.ndarray, n_groups: int):
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.n_groups = int(n_groups)
+
+    def search(self, queries: SparseRows, k: int):
+        """Return (scores, group ids) of the top k items per query, best first."""
+        n_queries = len(queries)
+        starts = self.indptr[queries.indices]
+        lengths = self.indptr[queries.indices + 1] - starts
+        positions = concatenated_ranges(starts, lengths)
+        query_rows = np.repeat(np.repeat(np.arange(n_queries), np.diff(queries.indptr)), lengths)
+        weights = np.repeat(queries.data, lengths) * self.similarities[positions]
+        scores = np.bincount(query_rows * self.n_groups + self.neighbours[positions], weights=weights,
+                             minlength=n_queries * self.n_groups).reshape(n_queries, self.n_groups).astype(np.float32)
+
+        ids = top_k(scores, min(k, self.n_groups))
+        item_scores = np.take_along_axis(scores, ids, axis=1)
+        return item_scores, np.where(item_scores > 0, ids, -1)
+
+    def to_arrays(self) -> dict:
+        return {"indptr": self.indptr, "neighbours": self.neighbours, "similarities": self.similarities,
+                "n_groups": np.array(self.n_groups)}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "ItemNeighbourIndex":
+        return cls(arrays["indptr"], arrays["neighbours"], arrays["similarities"], arrays["n_groups"].item())
+
+
+def concatenated_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """np.concatenate([np.arange(start, start + length) ...]) without the Python loop."""
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+def build_item_cf(user_codes: np.ndarray, item_codes: np.ndarray, ratings: np.ndarray, partition_items: dict,
+                  n_neighbours: int):
+    """Build user rental rows and one ItemNeighbourIndex per partition from (user, item, rating) triples.
+
+    partition_items maps each partition key to the item codes of its items, in
+    partition order. Items are compared by the cosine similarity of their rating
+    columns, and each user's ratings are scaled to sum to 1 so scores stay in [0, 1].
+    Returns (SparseRows of users over item codes, {partition key: index}).
+    """
+    from scipy import sparse
+
+    ratings = np.nan_to_num(np.asarray(ratings, dtype=np.float32))
+    matrix = sparse.csr_matrix((ratings, (user_codes, item_codes)), shape=(user_codes.max() + 1, item_codes.max() + 1))
+    matrix.sum_duplicates()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float32).ravel())
+    normalized = (matrix @ sparse.diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0))).tocsc()
+    similarity = (normalized.T @ normalized).tocsc()
+    similarity = (similarity - sparse.diags(similarity.diagonal())).tocsc()
+    similarity.eliminate_zeros()
+
+    totals = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+    user_items = (sparse.diags(np.divide(1, totals, out=np.zeros_like(totals), where=totals > 0)) @ matrix).tocsr()
+    user_items = SparseRows(user_items.indptr.astype(np.int64), user_items.indices.astype(np.int32),
+                            user_items.data.astype(np.float32))
+
+    indexes = {}
+    for key, columns in partition_items.items():
+        block = similarity[:, columns].tocsr()
+        indptr, neighbours, similarities = top_neighbours(block.indptr, block.indices, block.data, n_neighbours)
+        indexes[key] = ItemNeighbourIndex(indptr, neighbours.astype(np.int32), similarities.astype(np.float32), len(columns))
+    return user_items, indexes
+
+
+def top_neighbours(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, k: int):
+    """Keep the k largest entries of every row of a CSR matrix."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.lexsort((-data, rows))
+    keep = np.sort(order[np.arange(len(order)) - indptr[rows] < k])
+    counts = np.bincount(rows[keep], minlength=len(indptr) - 1)
+    return np.r_[0, np.cumsum(counts)].astype(np.int64), indices[keep], data[keep]
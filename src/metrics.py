@@ -0,0 +1,82 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class StageMetrics:
+    """Latency histograms per request stage, rendered in the Prometheus text exposition format."""
+
+    def __init__(self, buckets: tuple = Config.METRICS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Per stage: observations per bucket (the last one past every bound) and their total
+        self.counts = {}
+        self.sums = {}
+
+    def observe(self, stage: str, seconds: float):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            if stage not in self.counts:
+                self.counts[stage] = [0] * (len(self.buckets) + 1)
+                self.sums[stage] = 0.0
+            self.counts[stage][bucket] += 1
+            self.sums[stage] += seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP recommender_stage_seconds Time spent in each stage of serving recommendations.",
+            "# TYPE recommender_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, counts in sorted(self.counts.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'recommender_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'recommender_stage_seconds_sum{{stage="{stage}"}} {self.sums[stage]!r}')
+                lines.append(f'recommender_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+
+def render_counters(name: str, help_text: str, values: dict, label: str) -> str:
+    """Render {label value: count} as one Prometheus counter family."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines.extend(f'{name}{{{label}="{key}"}} {value}' for key, value in values.items())
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times the consecutive stages of one request.
+
+    lap(stage) charges the time since the previous lap to stage; finish(event)
+    records every stage, and the total under the event's name, in the metrics and,
+    when debug logging is on, logs them as one JSON line.
+    """
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+        self.durations = {}
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.durations[stage] = self.durations.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def finish(self, event: str, **fields):
+        total = self.last - self.start
+        for stage, seconds in self.durations.items():
+            self.metrics.observe(stage, seconds)
+        self.metrics.observe(event, total)
+        if logger.isEnabledFor(logging.DEBUG):
+            stages_ms = {stage: round(seconds * 1000, 3) for stage, seconds in self.durations.items()}
+            logger.debug(json.dumps(dict(event=event, total_ms=round(total * 1000, 3), stages_ms=stages_ms, **fields)))
+
+
+# Shared by the serving components and rendered by the app's /metrics endpoint
+metrics = StageMetrics()
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from .config import Config
+
+class MicroBatcher:
+    """Collect items submitted by concurrent requests into batches handled on one background thread.
+
+    A lone item is handed to handler(items) -> results at once. When others are
+    already queued behind it, the batch is handed over once it holds max_batch_size
+    items or max_wait_ms has passed; every submitter gets its own result, or the
+    handler's exception, through a Future. When handling a batch fails, its items
+    are handled one by one, so a bad item cannot fail the others.
+    """
+
+    def __init__(self, handler, max_batch_size: int = Config.MICRO_BATCH_MAX_SIZE,
+                 max_wait_ms: float = Config.MICRO_BATCH_MAX_WAIT_MS):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self.start()
+        # A process forked from this one (a pre-fork server's worker) inherits no running
+        # thread, so it starts its own batcher thread with an empty queue
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        self.pending = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.pending.put((item, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.pending.get()]
+            # A request with nothing else queued behind it is scored at once; waiting only
+            # pays off while requests arrive concurrently, e.g. with a threaded server
+            while len(batch) < self.max_batch_size and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            deadline = time.monotonic() + self.max_wait
+            while 1 < len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.handle(batch)
+
+    def handle(self, batch: list):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                batch[0][1].set_exception(error)
+                return
+            # Handle every item on its own, so one bad item only fails its own request
+            for item, future in batch:
+                self.handle_one(item, future)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def handle_one(self, item, future: Future):
+        try:
+            future.set_result(self.handler([item])[0])
+        except Exception as error:
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
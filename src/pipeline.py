@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+from .config import Config
+from .serving import file_version
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """One pipeline step computing func(*values of its inputs).
+
+    Its checkpoint key hashes its name, params and the keys of its inputs, so it
+    reruns only when one of them changes. With content_key, the stages that depend
+    on it key on a hash of its value instead, and are skipped when it recomputes an
+    unchanged value. Files listed in outputs are written by func; its checkpoint is
+    only valid while they are unchanged.
+    """
+
+    def __init__(self, name: str, func, inputs: list = (), params=None, outputs: list = (), content_key: bool = False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = params
+        self.outputs = list(outputs)
+        self.content_key = content_key
+
+
+class PipelineRunner:
+    """Runs a DAG of stages, checkpointing every result under checkpoint_dir.
+
+    A run only computes the stages whose key changed since their checkpoint was
+    written, and loads a checkpoint only when a stage that does run needs it. A
+    failed run keeps the checkpoints of the stages it completed, so the next run
+    resumes after them. force reruns every stage.
+    """
+
+    def __init__(self, checkpoint_dir: str = Config.CHECKPOINT_DIR, force: bool = False):
+        self.checkpoint_dir = checkpoint_dir
+        self.force = force
+        self.stages = {}
+        self.checkpoint_keys = {}
+        self.keys = {}
+        self.values = {}
+        self.ran = []
+
+    def add(self, stage: Stage) -> str:
+        """Add a stage after the stages it depends on and return its name."""
+        missing = [name for name in stage.inputs if name not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {missing}.")
+        self.stages[stage.name] = stage
+        return stage.name
+
+    def run(self, target: str):
+        """Bring target and everything it depends on up to date and return its value."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        value = self.value(target)
+        self.remove_stale_checkpoints()
+        return value
+
+    def checkpoint_key(self, name: str) -> str:
+        if name not in self.checkpoint_keys:
+            stage = self.stages[name]
+            payload = json.dumps([name, stage.params, [self.key(input_name) for input_name in stage.inputs]], default=str)
+            self.checkpoint_keys[name] = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        return self.checkpoint_keys[name]
+
+    def key(self, name: str) -> str:
+        """The key dependent stages see: the checkpoint key, or the value's hash for content-keyed stages."""
+        if name not in self.keys:
+            metadata = self.load_metadata(name)
+            if metadata is not None:
+                self.keys[name] = metadata["content_hash"] or self.checkpoint_key(name)
+            else:
+                self.value(name)
+        return self.keys[name]
+
+    def value(self, name: str):
+        if name in self.values:
+            return self.values[name]
+        stage = self.stages[name]
+        path = self.checkpoint_path(name)
+        metadata = self.load_metadata(name)
+        if metadata is not None:
+            logger.info(f"Stage {name} is up to date")
+            with open(path + ".pkl", "rb") as file:
+                value = pickle.load(file)
+        else:
+            logger.info(f"Running stage {name}...")
+            value = stage.func(*[self.value(input_name) for input_name in stage.inputs])
+            metadata = {
+                "content_hash": hash_value(value) if stage.content_key else None,
+                "files": {output: file_version(output) for output in stage.outputs if os.path.exists(output)},
+            }
+            # The metadata file is written last and marks the checkpoint as complete
+            write_atomic(path + ".pkl", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            write_atomic(path + ".json", json.dumps(metadata).encode("utf-8"))
+            self.ran.append(name)
+        self.values[name] = value
+        self.keys[name] = metadata["content_hash"] or self.checkpoint_key(name)
+        return value
+
+    def checkpoint_path(self, name: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{name}-{self.checkpoint_key(name)}")
+
+    def load_metadata(self, name: str):
+        """Metadata of the stage's current checkpoint, or None when the stage has to run."""
+        path = self.checkpoint_path(name)
+        if self.force and name not in self.ran:
+            return None
+        if not os.path.exists(path + ".json") or not os.path.exists(path + ".pkl"):
+            return None
+        with open(path + ".json") as file:
+            metadata = json.load(file)
+        for output in self.stages[name].outputs:
+            recorded = metadata["files"].get(output)
+            if recorded is None or not os.path.exists(output) or list(file_version(output)) != recorded:
+                return None
+        return metadata
+
+    def remove_stale_checkpoints(self):
+        """Delete checkpoints of earlier keys of the stages this run resolved, and of stages that no longer exist."""
+        current = {os.path.basename(self.checkpoint_path(name)) for name in self.checkpoint_keys}
+        for path in glob.glob(os.path.join(self.checkpoint_dir, "*-*.*")):
+            stem, extension = os.path.splitext(os.path.basename(path))
+            name = stem.rsplit("-", 1)[0]
+            if extension in (".pkl", ".json") and stem not in current and (name in self.checkpoint_keys or name not in self.stages):
+                os.remove(path)
+
+
+def hash_value(value) -> str:
+    return hashlib.sha256(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()[:32]
+
+
+def write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
@@ -1,110 +1,405 @@
+import os
+import time
+import logging
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from .config import Config
+from .vector_index import build_index as build_vector_index, inverse_norms, save_indexes, load_indexes
+from .storage import save_frame, load_frame
+from .serving import ServingModel, recommend_snapshot
+from .result_cache import ResultCache
+from .item_cf import build_item_cf
+
+ITEM_KEYS = ["rented for", "category", "item_id"]
+# Interaction columns read besides the similarity features
+INTERACTION_COLUMNS = ["user_id", "item_id", "rating", "rented for", "category", "embedding_row"]
+# Item columns returned with recommendations
+ITEM_COLUMNS = ["item_id", "average_rating", "review_count", "category", "rented for"]
+# Columns of the frames recommend_items returns
+RECOMMENDATION_COLUMNS = ["item_id", "average_rating", "review_count", "similarity_score", "category", "rented_for"]
+ITEM_AGGREGATIONS = ("max", "mean", "weighted_mean")
+SCORING_ENGINES = ("content", "item_cf")
+# Embedding rows read at a time when aggregating the memory-mapped matrix
+EMBEDDING_CHUNK_ROWS = 65536
+
+logger = logging.getLogger(__name__)
 
 class Recommender:
-    def __init__(self, user_interactions_file: str = Config.USER_INTERACTIONS_FILE, recommendation_file: str = Config.RECOMMENDATION_FILE):
+    def __init__(self, user_interactions_file: str = Config.USER_INTERACTIONS_FILE, recommendation_file: str = Config.RECOMMENDATION_FILE,
+                 item_profiles_file: str = Config.ITEM_PROFILES_FILE, item_aggregation: str = Config.ITEM_AGGREGATION,
+                 vector_index_file: str = Config.VECTOR_INDEX_FILE, index_backend: str = Config.VECTOR_INDEX_BACKEND,
+                 embeddings_file: str = Config.EMBEDDINGS_FILE, engine: str = Config.SCORING_ENGINE):
+        if item_aggregation not in ITEM_AGGREGATIONS:
+            raise ValueError(f"Unknown item aggregation '{item_aggregation}'. Expected one of {ITEM_AGGREGATIONS}.")
+        if engine not in SCORING_ENGINES:
+            raise ValueError(f"Unknown scoring engine '{engine}'. Expected one of {SCORING_ENGINES}.")
         self.user_interactions_file = user_interactions_file
         self.recommendation_file = recommendation_file
+        self.item_profiles_file = item_profiles_file
+        self.item_aggregation = item_aggregation
+        self.vector_index_file = vector_index_file
+        self.index_backend = index_backend
+        self.embeddings_file = embeddings_file
+        self.engine = engine
         self.interaction_df = None
+        self.embeddings = None
+
+        # Lookup structures built once by build_index()
+        self.similarity_features = []
+        self.item_profiles = None
+        self.item_stats = None
+        self.partitions = {}
+        self.indexes = {}
+        self.user_profiles = None
+        self.user_index = {}
+
+        # Request-level caches, cleared whenever the index is built; the snapshot
+        # shares the lookup structures with ServingModel's scoring
+        self.snapshot = None
+        self.result_cache = ResultCache(Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL)
+        self.partition_cache = ResultCache(Config.PARTITION_CACHE_SIZE, None)
 
     def load_interactions(self):
-        """Load interaction data from a pickle file."""
-        self.interaction_df = pd.read_pickle(self.user_interactions_file)
+        """Load interaction data and build the lookup structures."""
+        self.interaction_df = load_frame(self.user_interactions_file, columns=self.interaction_columns)
+        self.embeddings = self.load_embeddings()
+        self.build_index()
 
-    def recommend_items(self, user_id: str, occasion: str, category: str, top_n: int = Config.NUM_RECOMMENDATIONS) -> pd.DataFrame:
-        """Generate item recommendations for a specific user, occasion, and category."""
-        if self.interaction_df is None:
-            raise ValueError("Interactions not loaded. Call load_interactions() first.")
+    def load_embeddings(self):
+        """Memory-map the text embedding matrix referenced by the interactions' embedding_row column."""
+        if "embedding_row" not in self.interaction_df.columns:
+            return None
+        if not os.path.exists(self.embeddings_file):
+            raise FileNotFoundError(f"Embeddings file not found at {self.embeddings_file}")
+        # Read-only mapping: every process serving the same file shares its pages
+        return np.load(self.embeddings_file, mmap_mode="r")
 
-        # Filter items based on occasion and category
-        filtered_items = self.interaction_df[
-            (self.interaction_df["rented for"] == occasion) & 
-            (self.interaction_df["category"] == category)
-        ]
+    @property
+    def embedding_columns(self) -> list:
+        """Names of the memory-mapped embedding dimensions, as used in item profiles."""
+        if self.embeddings is None:
+            return []
+        return [f"text_emb_{i}" for i in range(self.embeddings.shape[1])]
 
-        if filtered_items.empty:
-            return pd.DataFrame()
+    def interaction_columns(self, columns: list) -> list:
+        """Project stored interaction columns onto the ones the recommender uses, keeping their order."""
+        features = set(self.get_similarity_features(pd.DataFrame(columns=columns)))
+        return [col for col in columns if col in INTERACTION_COLUMNS or col in features]
 
-        # Define features for similarity calculation
+    def get_similarity_features(self, df: pd.DataFrame) -> list:
+        """Return the feature columns used for similarity, in a fixed order."""
         potential_features = [
             "fit_encoded", "bust_cup_encoded", "bust_band", "BMI", "size_encoded", "days_since_review",
             "review_length", "positive_word_count", "negative_word_count"
         ]
 
         for col in ["body type_encoded", "rented for_encoded", "category_encoded"]:
-            if col in self.interaction_df.columns:
+            if col in df.columns:
                 potential_features.append(col)
 
-        embedding_features = [col for col in self.interaction_df.columns if col.startswith("text_emb_")]
+        embedding_features = [col for col in df.columns if col.startswith("text_emb_")]
         potential_features.extend(embedding_features)
 
-        similarity_features = [f for f in potential_features if f in self.interaction_df.columns]
+        return [f for f in potential_features if f in df.columns]
 
-        # Debugging: Check NaN in similarity features
-        print("Debugging Similarity Features:")
-        print("Selected Features:", similarity_features)
-        print("Columns with NaN in Interaction Data (Filtered Items):")
-        print(filtered_items[similarity_features].isna().sum())
+    def _embedding_means(self, codes: np.ndarray, n_groups: int, weights: np.ndarray = None) -> np.ndarray:
+        """Average the embedding rows of each group code, reading the memory-mapped matrix in chunks."""
+        rows = self.interaction_df["embedding_row"].to_numpy()
+        weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+        valid = codes >= 0
+        codes, rows, weights = codes[valid], rows[valid], weights[valid]
 
-        # Generate user vector
-        user_data = self.interaction_df[self.interaction_df["user_id"] == float(user_id)][similarity_features]
-        print("User Data Sample:")
-        print(user_data.head())
+        totals = np.bincount(codes, weights=weights, minlength=n_groups)
+        scale = weights / np.where(totals > 0, totals, 1)[codes]
+        grouping = sparse.csc_matrix((scale, (codes, rows)), shape=(n_groups, len(self.embeddings)))
 
-        if user_data.empty:
-            print(f"User ID {user_id} has no relevant data.")
-            return pd.DataFrame()
+        means = np.zeros((n_groups, self.embeddings.shape[1]))
+        for start in range(0, len(self.embeddings), EMBEDDING_CHUNK_ROWS):
+            stop = start + EMBEDDING_CHUNK_ROWS
+            means += grouping[:, start:stop] @ np.asarray(self.embeddings[start:stop], dtype=np.float32)
+        return means.astype(np.float32)
+
+    def _embedding_block(self, rows: np.ndarray) -> np.ndarray:
+        """Return embedding rows, as a zero-copy view of the mapping when they are contiguous."""
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows) and np.all(np.diff(rows) == 1):
+            return self.embeddings[rows[0]:rows[-1] + 1]
+        return self.embeddings[rows]
 
-        user_vector = user_data.mean().values.reshape(1, -1)
-
-        # Debugging: Check NaN in user vector
-        print("User Vector NaN Check:")
-        print(pd.DataFrame(user_vector).isna().sum())
-
-        # Handle cases where the user vector contains NaN values
-        if np.isnan(user_vector).any():
-            print("User vector contains NaN values. Filling NaN with 0.")
-            user_vector = np.nan_to_num(user_vector)
-
-        # Prepare item matrix
-        item_matrix = filtered_items[similarity_features].values
-
-        # Debugging: Check NaN in item matrix
-        print("Item Matrix NaN Check:")
-        print(pd.DataFrame(item_matrix).isna().sum())
-
-        # Handle cases where the item matrix contains NaN values
-        if np.isnan(item_matrix).any():
-            print("Item matrix contains NaN values. Filling NaN with 0.")
-            item_matrix = np.nan_to_num(item_matrix)
-
-        # Calculate similarity scores
-        similarity_scores = cosine_similarity(user_vector, item_matrix).flatten()
-
-        # Attach similarity scores to filtered items
-        filtered_items = filtered_items.copy()
-        filtered_items["similarity_score"] = similarity_scores
-
-        # Aggregate and sort recommendations
-        recommendations = (
-            filtered_items.groupby("item_id")
-            .agg(
-                average_rating=("rating", "mean"),
-                review_count=("user_id", "count"),
-                similarity_score=("similarity_score", "max"),
-                category=("category", "first"),
-                rented_for=("rented for", "first")
-            )
-            .reset_index()
-            .sort_values(by="similarity_score", ascending=False)
-            .head(top_n)
+    def build_item_profiles(self) -> pd.DataFrame:
+        """Aggregate review rows into one stats and mean feature vector row per (occasion, category, item)."""
+        df = self.interaction_df
+        features = df[self.get_similarity_features(df)]
+        grouped = df.groupby(ITEM_KEYS, sort=True, observed=True)
+
+        item_stats = grouped.agg(
+            average_rating=("rating", "mean"),
+            review_count=("user_id", "count"),
         )
-        recommendations['item_id'] = recommendations['item_id'].astype('int')
-        return recommendations
+
+        # Weighted mean weights every review by its rating
+        weights = None
+        if self.item_aggregation == "weighted_mean":
+            weights = df["rating"].fillna(0)
+            present = features.notna().mul(weights, axis=0)
+            weighted = features.fillna(0).mul(weights, axis=0)
+            vectors = weighted.groupby([df[key] for key in ITEM_KEYS], sort=True, observed=True).sum() / \
+                present.groupby([df[key] for key in ITEM_KEYS], sort=True, observed=True).sum()
+        else:
+            vectors = features.groupby([df[key] for key in ITEM_KEYS], sort=True, observed=True).mean()
+
+        if self.embeddings is not None:
+            embedding_means = self._embedding_means(grouped.ngroup().to_numpy(), len(item_stats), weights)
+            vectors = pd.concat([vectors, pd.DataFrame(embedding_means, index=vectors.index, columns=self.embedding_columns)], axis=1)
+
+        profiles = pd.concat([item_stats, vectors], axis=1).reset_index()
+        profiles["item_id"] = profiles["item_id"].astype("int")
+        profiles.attrs["item_aggregation"] = self.item_aggregation
+        return profiles
+
+    def save_item_profiles(self, profiles: pd.DataFrame):
+        """Save item profiles to a pickle file."""
+        profiles.to_pickle(self.item_profiles_file)
+
+    def load_item_profiles(self) -> pd.DataFrame:
+        """Load item profiles saved for the current interactions, or build them in memory."""
+        if os.path.exists(self.item_profiles_file) and \
+                os.path.getmtime(self.item_profiles_file) >= os.path.getmtime(self.user_interactions_file):
+            profiles = pd.read_pickle(self.item_profiles_file)
+            if profiles.attrs.get("item_aggregation") == self.item_aggregation:
+                return profiles
+        return self.build_item_profiles()
+
+    @staticmethod
+    def item_review_stats(grouped) -> pd.DataFrame:
+        """Rating and review count of every (occasion, category, item) group, in group order."""
+        item_stats = grouped.agg(
+            average_rating=("rating", "mean"),
+            review_count=("user_id", "count"),
+        ).reset_index()
+        item_stats["item_id"] = item_stats["item_id"].astype("int")
+        return item_stats
+
+    @staticmethod
+    def partition_ranges(item_stats: pd.DataFrame) -> dict:
+        """Map every (occasion, category) to the range of its rows in item_stats."""
+        partitions = {}
+        partition_groups = item_stats.groupby(["rented for", "category"], sort=False, observed=True).indices
+        for (occasion, category), positions in partition_groups.items():
+            partitions[(occasion, category)] = (positions[0], positions[-1] + 1)
+        return partitions
+
+    def build_index(self):
+        """Precompute user profile vectors and item partitions keyed by (occasion, category), and the snapshot scored from them."""
+        if self.engine == "item_cf":
+            self.build_item_cf_index()
+        else:
+            self.build_content_index()
+        self.result_cache.clear()
+        self.partition_cache.clear()
+        self.snapshot = ServingModel.snapshot_from(self)
+
+    def build_content_index(self):
+        """Content engine: cosine similarity between user profiles and item feature vectors."""
+        df = self.interaction_df
+        self.similarity_features = self.get_similarity_features(df)
+        features = df[self.similarity_features]
+
+        if Config.DEBUG_DIAGNOSTICS:
+            nan_counts = features.isna().sum()
+            if nan_counts.any():
+                logger.debug("Filling NaN with 0 in similarity features:\n%s", nan_counts[nan_counts > 0])
+
+        if self.item_aggregation == "max":
+            # Score every review row; rows are grouped by (occasion, category, item) so
+            # every partition and every item within it is a contiguous block
+            grouped = df.groupby(ITEM_KEYS, sort=True, observed=True)
+            group_ids = grouped.ngroup().to_numpy()
+            valid = group_ids >= 0
+            order = np.flatnonzero(valid)[np.argsort(group_ids[valid], kind="stable")]
+
+            item_stats = self.item_review_stats(grouped)
+
+            item_matrix = np.nan_to_num(features.to_numpy(dtype=np.float32)[order])
+            item_embedding_rows = df["embedding_row"].to_numpy()[order] if self.embeddings is not None else None
+            item_offsets = np.searchsorted(group_ids[order], np.arange(len(item_stats)))
+        else:
+            # Score one aggregated profile per item
+            self.item_profiles = self.load_item_profiles()
+            item_stats = self.item_profiles[ITEM_KEYS + ["average_rating", "review_count"]]
+            profile_features = self.similarity_features + self.embedding_columns
+            item_matrix = np.nan_to_num(self.item_profiles[profile_features].to_numpy(dtype=np.float32))
+            item_embedding_rows = None
+            item_offsets = None
+
+        self.item_stats = item_stats
+        self.partitions = self.partition_ranges(item_stats)
+
+        # One vector index per partition, reused from disk when it was saved for the
+        # current interactions; review embeddings stay in the shared memory-mapped matrix
+        self.indexes = self.load_vector_indexes()
+        if self.indexes is None:
+            self.indexes = {}
+            for key, (first_item, last_item) in self.partitions.items():
+                if item_offsets is None:
+                    rows, offsets = slice(first_item, last_item), None
+                else:
+                    row_stop = item_offsets[last_item] if last_item < len(item_offsets) else len(item_matrix)
+                    rows = slice(item_offsets[first_item], row_stop)
+                    offsets = item_offsets[first_item:last_item] - item_offsets[first_item]
+
+                blocks = [item_matrix[rows]]
+                if item_embedding_rows is not None:
+                    blocks.append(self._embedding_block(item_embedding_rows[rows]))
+                self.indexes[key] = build_vector_index(self.index_backend, blocks, offsets, inverse_norms(blocks))
+
+        # User profiles: mean over all of a user's interactions, NaN filled afterwards
+        profiles = features.groupby(df["user_id"], sort=False).mean()
+        user_profiles = np.nan_to_num(profiles.to_numpy(dtype=np.float32))
+        if self.embeddings is not None:
+            user_codes = df.groupby("user_id", sort=False).ngroup().to_numpy()
+            user_profiles = np.hstack([user_profiles, self._embedding_means(user_codes, len(profiles))])
+        self.user_profiles = np.ascontiguousarray(self._normalize(user_profiles))
+        self.user_index = {float(user): i for i, user in enumerate(profiles.index)}
+
+    def build_item_cf_index(self):
+        """Item-item collaborative filtering: score a partition's items by their co-rental similarity to the user's items."""
+        df = self.interaction_df
+        self.similarity_features = []
+        self.item_stats = self.item_review_stats(df.groupby(ITEM_KEYS, sort=True, observed=True))
+        self.partitions = self.partition_ranges(self.item_stats)
+
+        user_codes, users = pd.factorize(df["user_id"])
+        item_codes, items = pd.factorize(df["item_id"].astype("int64"))
+        item_columns = pd.Index(items).get_indexer(self.item_stats["item_id"])
+        partition_items = {key: item_columns[first_item:last_item] for key, (first_item, last_item) in self.partitions.items()}
+
+        self.user_profiles, self.indexes = build_item_cf(user_codes, item_codes, df["rating"].to_numpy(),
+                                                         partition_items, Config.ITEM_CF_NEIGHBOURS)
+        self.user_index = {float(user): i for i, user in enumerate(users)}
+
+    def save_vector_indexes(self):
+        """Save the per-partition vector indexes next to the interactions file."""
+        # Exact search reads the item features directly, and item_cf neighbours are
+        # cheap to rebuild, so there is nothing to precompute
+        if self.index_backend == "exact" or self.engine != "content":
+            return
+        save_indexes(self.indexes, self.vector_index_file,
+                     backend=self.index_backend, item_aggregation=self.item_aggregation)
+
+    def load_vector_indexes(self):
+        """Load vector indexes saved for the current interactions and settings, or return None."""
+        if self.index_backend == "exact" or not os.path.exists(self.vector_index_file) or \
+                os.path.getmtime(self.vector_index_file) < os.path.getmtime(self.user_interactions_file):
+            return None
+        indexes, metadata = load_indexes(self.vector_index_file)
+        if metadata.get("backend") != self.index_backend or \
+                metadata.get("item_aggregation") != self.item_aggregation or set(indexes) != set(self.partitions):
+            return None
+        return indexes
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        """L2-normalize rows in place, leaving all-zero rows as zeros."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def recommend_items(self, user_id: str, occasion: str, category: str, top_n: int = Config.NUM_RECOMMENDATIONS) -> pd.DataFrame:
+        """Generate item recommendations for a specific user, occasion, and category."""
+        if Config.DEBUG_DIAGNOSTICS and (occasion, category) in self.partitions and float(user_id) not in self.user_index:
+            logger.debug(f"User ID {user_id} has no relevant data.")
+        return self.recommend_many([(user_id, occasion, category, top_n)])[0]
+
+    def recommend_many(self, queries: list) -> list:
+        """Recommend for many (user_id, occasion, category, top_n) queries, scoring each partition with one search.
+
+        Returns one DataFrame per query, in order; unknown users and partitions, and top_n below 1, get an empty one.
+        """
+        if self.interaction_df is None:
+            raise ValueError("Interactions not loaded. Call load_interactions() first.")
+        # Scored exactly as ServingModel scores its artifact
+        results = recommend_snapshot(self.snapshot, queries, self.result_cache)
+        return [pd.DataFrame(records, columns=RECOMMENDATION_COLUMNS) for records in results]
+
+    def partition_items(self, occasion: str, category: str) -> dict:
+        """Item columns of one (occasion, category) partition as arrays, cached between requests."""
+        items = self.partition_cache.get((occasion, category))
+        if items is None:
+            first_item, last_item = self.partitions[(occasion, category)]
+            partition = self.item_stats.iloc[first_item:last_item]
+            items = {col: partition[col].to_numpy() for col in ITEM_COLUMNS}
+            self.partition_cache.put((occasion, category), items)
+        return items
+
+    def recommend_batch(self, user_ids, categories=None, occasions=None, top_n: int = Config.NUM_RECOMMENDATIONS,
+                        block_size: int = Config.BATCH_BLOCK_SIZE) -> pd.DataFrame:
+        """Generate top_n recommendations for many users over every (occasion, category) partition."""
+        if self.interaction_df is None:
+            raise ValueError("Interactions not loaded. Call load_interactions() first.")
+
+        # Resolve users once; users without interactions get no recommendations
+        user_ids = [user_id for user_id in user_ids if float(user_id) in self.user_index]
+        if not user_ids or top_n < 1:
+            return pd.DataFrame()
+        user_rows = np.array([self.user_index[float(user_id)] for user_id in user_ids])
+        user_ids = np.asarray(user_ids)
+
+        # One row per user, partition and item: partition keys are stored as categorical
+        # codes and counts as 32-bit integers, so the frame stays small at full scale
+        occasion_names = pd.Index(sorted({occasion for occasion, _ in self.partitions}))
+        category_names = pd.Index(sorted({category for _, category in self.partitions}))
+        item_id_dtype = np.int32 if self.item_stats["item_id"].max() <= np.iinfo(np.int32).max else np.int64
+
+        results = []
+        for occasion, category in self.partitions:
+            if categories is not None and category not in categories:
+                continue
+            if occasions is not None and occasion not in occasions:
+                continue
+
+            index = self.indexes[(occasion, category)]
+            items = self.partition_items(occasion, category)
+
+            # Score users in blocks to bound the size of the (users x rows) score matrix
+            for block_start in range(0, len(user_rows), block_size):
+                block_rows = user_rows[block_start:block_start + block_size]
+                item_scores, candidates = index.search(self.user_profiles[block_rows], top_n)
+                found = candidates >= 0
+                item_rows = candidates[found]
+
+                n_rows = len(item_rows)
+                results.append(pd.DataFrame({
+                    "user_id": np.repeat(user_ids[block_start:block_start + block_size], found.sum(axis=1)),
+                    "category": pd.Categorical.from_codes(np.full(n_rows, category_names.get_loc(category)), category_names),
+                    "occasion": pd.Categorical.from_codes(np.full(n_rows, occasion_names.get_loc(occasion)), occasion_names),
+                    "item_id": items["item_id"][item_rows].astype(item_id_dtype),
+                    "average_rating": items["average_rating"][item_rows],
+                    "review_count": items["review_count"][item_rows].astype(np.int32),
+                    "similarity_score": item_scores[found],
+                }))
+
+        if not results:
+            return pd.DataFrame()
+        return pd.concat(results, ignore_index=True)
 
     def save_recommendations(self, df: pd.DataFrame):
-        """Save recommendations to a pickle file."""
-        df.to_pickle(self.recommendation_file)
+        """Save recommendations to a pickle or Parquet file."""
+        save_frame(df, self.recommendation_file)
+
 
+def hit_rate_report(recommender: Recommender, held_out: pd.DataFrame, top_n: int) -> dict:
+    """Score held-out interactions: the share recommended within top_n in their own partition, and latency in ms."""
+    hits, found, latencies = [], [], []
+    for user_id, occasion, category, item_id in held_out[["user_id", "rented for", "category", "item_id"]].itertuples(index=False):
+        start = time.perf_counter()
+        recommendations = recommender.recommend_items(user_id, occasion, category, top_n)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(len(recommendations) > 0)
+        hits.append(len(recommendations) > 0 and int(item_id) in recommendations["item_id"].tolist())
+    return {
+        "hit_rate": float(np.mean(hits)),
+        "coverage": float(np.mean(found)),
+        "ms_p50": float(np.percentile(latencies, 50)),
+        "ms_p99": float(np.percentile(latencies, 99)),
+    }
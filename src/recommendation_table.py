@@ -0,0 +1,115 @@
+import threading
+import numpy as np
+from .config import Config
+from .result_cache import ResultCache
+from .serving import publish_arrays, current_generation, map_arrays, sorted_row, to_records
+
+class RecommendationTable:
+    """Precomputed recommendations (as written by main.py) indexed by (user_id, category, occasion).
+
+    Rows are sorted by a composite integer key, so a lookup is two binary searches.
+    The table is mapped read-only from the current generation of table_dir, shared by
+    every worker process, and a new generation is swapped in with a single
+    assignment, so a request only ever sees one complete version.
+    """
+
+    def __init__(self, table_dir: str = Config.RECOMMENDATION_TABLE_DIR):
+        self.table_dir = table_dir
+        self.version = None
+        self.snapshot = None
+        self.reload_lock = threading.Lock()
+        # Built records of repeated lookups; cleared with every new version of the table
+        self.result_cache = ResultCache(Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL)
+
+    @staticmethod
+    def table_arrays(df) -> dict:
+        """Index a recommendations DataFrame, as returned by Recommender.recommend_batch, into flat arrays."""
+        users, user_codes = np.unique(df["user_id"].to_numpy(dtype=np.float64), return_inverse=True)
+        grouped = df.groupby(["occasion", "category"], sort=False, observed=True)
+        partition_codes = grouped.ngroup().to_numpy()
+        partitions = list(grouped.size().index)
+
+        # Stable sort keeps every group's rows in their ranked order
+        keys = user_codes.astype(np.int64) * len(partitions) + partition_codes
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        _, counts = np.unique(keys, return_counts=True)
+        return {
+            "user_ids": users,
+            "occasions": np.array([str(occasion) for occasion, _ in partitions]),
+            "categories": np.array([str(category) for _, category in partitions]),
+            "keys": keys,
+            "top_n": np.array(counts.max() if len(counts) else 0),
+            "item_id": df["item_id"].to_numpy()[order],
+            "average_rating": df["average_rating"].to_numpy()[order],
+            "review_count": df["review_count"].to_numpy()[order],
+            "similarity_score": df["similarity_score"].to_numpy()[order],
+        }
+
+    def save(self, df):
+        publish_arrays(self.table_dir, self.table_arrays(df))
+
+    @staticmethod
+    def build_snapshot(arrays: dict) -> dict:
+        partitions = zip(arrays["occasions"].tolist(), arrays["categories"].tolist())
+        return dict(
+            arrays,
+            partitions={partition: code for code, partition in enumerate(partitions)},
+            top_n=int(arrays["top_n"]),
+        )
+
+    def reload_if_changed(self) -> bool:
+        """Load the table if its file changed; requests use the previous version until the new one is ready."""
+        try:
+            version = current_generation(self.table_dir)
+        except FileNotFoundError:
+            return False
+        # Only one thread rebuilds; the others keep serving the current snapshot
+        if version == self.version or not self.reload_lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                arrays = map_arrays(self.table_dir, version[1])
+            except FileNotFoundError:
+                # A newer publish deleted this generation after CURRENT was read: keep
+                # serving the current snapshot and pick up the newest one next request
+                return False
+            snapshot = self.build_snapshot(arrays)
+            self.snapshot = snapshot
+            self.version = version
+            self.result_cache.clear()
+        finally:
+            self.reload_lock.release()
+        return True
+
+    def recommend_items(self, user_id: str, occasion: str, category: str, top_n: int = Config.NUM_RECOMMENDATIONS):
+        """Return the precomputed recommendations as records, or None when they must be computed live."""
+        # Read the snapshot once so a concurrent reload cannot mix two versions
+        snapshot = self.snapshot
+        if top_n < 1:
+            return []
+        if snapshot is None or top_n > snapshot["top_n"]:
+            return None
+        partition = snapshot["partitions"].get((occasion, category))
+        if partition is None:
+            return None
+
+        # Cached records are shared, so treat them as read-only; keying on the snapshot keeps
+        # a lookup that races a reload from caching records of the previous version
+        cache_key = (id(snapshot), float(user_id), partition, top_n)
+        recommendations = self.result_cache.get(cache_key)
+        if recommendations is not None:
+            return recommendations
+
+        user = sorted_row(snapshot["user_ids"], float(user_id))
+        if user is None:
+            return None
+
+        key = user * len(snapshot["partitions"]) + partition
+        start, stop = np.searchsorted(snapshot["keys"], [key, key + 1])
+        if start == stop:
+            return None
+        rows = slice(start, min(stop, start + top_n))
+        recommendations = to_records(snapshot, rows, snapshot["similarity_score"][rows], occasion, category)
+        self.result_cache.put(cache_key, recommendations)
+        return recommendations
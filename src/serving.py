@@ -0,0 +1,279 @@
+import json
+import mmap
+import os
+import threading
+import numpy as np
+from .config import Config
+from .result_cache import ResultCache
+from .metrics import StageTimer, metrics as stage_metrics
+from .vector_index import INDEX_BACKENDS
+from .item_cf import ItemNeighbourIndex, SparseRows
+
+# The serving side only needs NumPy: pandas, scipy and the pipeline modules are
+# imported solely to build the model when its artifact has not been written yet
+ITEM_COLUMNS = ["item_id", "average_rating", "review_count"]
+SCORING_BACKENDS = dict(INDEX_BACKENDS, item_cf=ItemNeighbourIndex)
+# File in an artifact directory naming its current generation
+GENERATION_POINTER = "CURRENT"
+# Arrays start at multiples of this many bytes of a generation file, so every mapped array is aligned
+ARRAY_ALIGNMENT = 64
+
+
+def file_version(path: str) -> tuple:
+    """Identify the current version of a file by modification time and size."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def publish_arrays(directory: str, arrays: dict, keep: int = Config.SERVING_GENERATIONS_KEPT) -> str:
+    """Write arrays as the next generation of an artifact directory and point GENERATION_POINTER at it.
+
+    A generation is one flat binary file of aligned arrays plus a JSON layout. The
+    pointer is replaced atomically once both are complete, so readers see either the
+    old generation or the new one. Generations older than the newest keep are deleted;
+    processes that still map one keep reading it, as its pages stay valid until unmapped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    generations = list_generations(directory)
+    name = f"gen-{int(generations[-1][len('gen-'):]) + 1 if generations else 1:06d}"
+
+    layout = {}
+    with open(os.path.join(directory, f"{name}.bin.tmp"), "wb") as file:
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise TypeError(f"Array '{key}' has dtype object, which cannot be mapped.")
+            file.write(b"\0" * (-file.tell() % ARRAY_ALIGNMENT))
+            layout[key] = {"offset": file.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+            file.write(array.tobytes())
+    os.replace(os.path.join(directory, f"{name}.bin.tmp"), os.path.join(directory, f"{name}.bin"))
+    write_text(os.path.join(directory, f"{name}.json"), json.dumps(layout))
+    write_text(os.path.join(directory, GENERATION_POINTER), name)
+
+    for old in list_generations(directory)[:-keep]:
+        for extension in (".bin", ".json"):
+            os.remove(os.path.join(directory, old + extension))
+    return name
+
+
+def list_generations(directory: str) -> list:
+    names = [name[:-len(".json")] for name in os.listdir(directory) if name.startswith("gen-") and name.endswith(".json")]
+    return sorted(names, key=lambda name: int(name[len("gen-"):]))
+
+
+def write_text(path: str, text: str):
+    with open(f"{path}.tmp", "w") as file:
+        file.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+def current_generation(directory: str) -> tuple:
+    """(version, name) of the directory's current generation; raises FileNotFoundError before the first one."""
+    pointer = os.path.join(directory, GENERATION_POINTER)
+    version = file_version(pointer)
+    with open(pointer) as file:
+        return version, file.read().strip()
+
+
+def map_arrays(directory: str, name: str) -> dict:
+    """Map a generation's arrays read-only: no copy is made, and processes mapping it share its pages."""
+    with open(os.path.join(directory, f"{name}.json")) as file:
+        layout = json.load(file)
+    with open(os.path.join(directory, f"{name}.bin"), "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+    return {key: np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=spec["offset"])
+            for key, spec in layout.items()}
+
+
+def sorted_row(ids: np.ndarray, value: float, order: np.ndarray = None):
+    """Position of value in ids, which are sorted themselves or through order; None if absent."""
+    position = int(np.searchsorted(ids, value, sorter=order))
+    if position < len(ids):
+        row = position if order is None else int(order[position])
+        if ids[row] == value:
+            return row
+    return None
+
+
+def to_records(items: dict, rows, scores: np.ndarray, occasion: str, category: str) -> list:
+    """Recommendations as a list of dicts of native Python values, like Recommender.recommend_items(...).to_dict(orient="records")."""
+    return [
+        {"item_id": item_id, "average_rating": rating, "review_count": count, "similarity_score": score,
+         "category": category, "rented_for": occasion}
+        for item_id, rating, count, score in zip(items["item_id"][rows].tolist(), items["average_rating"][rows].tolist(),
+                                                 items["review_count"][rows].tolist(), scores.tolist())
+    ]
+
+
+def recommend_snapshot(snapshot: dict, queries: list, result_cache: ResultCache, metrics=stage_metrics) -> list:
+    """Recommend for many (user_id, occasion, category, top_n) queries, scoring each partition with one search.
+
+    snapshot holds sorted user ids, user vectors, per-partition indexes and item
+    columns, as built by ServingModel. Returns one list of records per query, in
+    order; unknown users and partitions, and top_n below 1, get an empty list.
+    """
+    # Cached lists are shared, so treat them as read-only
+    timer = StageTimer(metrics)
+    results = [None] * len(queries)
+    partition_queries = {}
+    for position, (user_id, occasion, category, top_n) in enumerate(queries):
+        results[position] = result_cache.get((id(snapshot), float(user_id), occasion, category, top_n))
+        if results[position] is not None:
+            continue
+        user_row = sorted_row(snapshot["user_ids"], float(user_id), snapshot["user_order"])
+        if top_n < 1 or (occasion, category) not in snapshot["indexes"] or user_row is None:
+            results[position] = []
+        else:
+            partition_queries.setdefault((occasion, category), []).append((position, user_row))
+    timer.lap("filter")
+
+    for (occasion, category), positioned_rows in partition_queries.items():
+        positions = [position for position, _ in positioned_rows]
+        user_rows = [user_row for _, user_row in positioned_rows]
+        user_vectors = snapshot["user_profiles"][user_rows]
+        timer.lap("user_vector")
+
+        max_top_n = max(queries[position][3] for position in positions)
+        item_scores, candidates = snapshot["indexes"][(occasion, category)].search(user_vectors, max_top_n)
+        items = snapshot["items"][(occasion, category)]
+        timer.lap("scoring")
+
+        for row, position in enumerate(positions):
+            user_id, _, _, top_n = queries[position]
+            found = candidates[row, :top_n] >= 0
+            records = to_records(items, candidates[row, :top_n][found], item_scores[row, :top_n][found], occasion, category)
+            result_cache.put((id(snapshot), float(user_id), occasion, category, top_n), records)
+            results[position] = records
+        timer.lap("aggregation")
+
+    timer.finish("recommend_many", queries=len(queries), partitions=len(partition_queries))
+    return results
+
+
+class ServingModel:
+    """Live scoring from a compact artifact: user profiles, per-partition vector indexes and item columns.
+
+    main.py publishes the artifact from a loaded Recommender as a generation of
+    serving_dir. Its arrays are mapped rather than loaded, so every worker process
+    serving them shares one copy. A new generation is mapped on the next request
+    after it is published and swapped in with a single assignment, so a request
+    only ever sees one complete version.
+    """
+
+    def __init__(self, serving_dir: str = Config.SERVING_MODEL_DIR, metrics=stage_metrics):
+        self.serving_dir = serving_dir
+        self.metrics = metrics
+        self.version = None
+        self.snapshot = None
+        self.reload_lock = threading.Lock()
+        self.result_cache = ResultCache(Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL)
+
+    @staticmethod
+    def artifact_arrays(recommender) -> dict:
+        """Collect what serving needs from a Recommender whose interactions are loaded."""
+        keys = list(recommender.partitions)
+        snapshot = ServingModel.snapshot_from(recommender)
+        arrays = {
+            # Looked up by binary search, so workers hold no per-user dictionary
+            "user_ids": snapshot["user_ids"],
+            "user_order": snapshot["user_order"],
+            "occasions": np.array([occasion for occasion, _ in keys], dtype=str),
+            "categories": np.array([category for _, category in keys], dtype=str),
+            "backends": np.array([recommender.indexes[key].backend for key in keys], dtype=str),
+        }
+        # The item_cf engine describes users by the items they rented instead of a dense vector
+        if isinstance(recommender.user_profiles, SparseRows):
+            arrays.update({f"user_items.{name}": array for name, array in recommender.user_profiles.to_arrays().items()})
+        else:
+            arrays["user_profiles"] = recommender.user_profiles
+        for i, key in enumerate(keys):
+            items = snapshot["items"][key]
+            for col in ITEM_COLUMNS:
+                arrays[f"{i}.item.{col}"] = np.asarray(items[col])
+            for name, array in recommender.indexes[key].to_arrays().items():
+                arrays[f"{i}.index.{name}"] = array
+        return arrays
+
+    def save(self, recommender):
+        publish_arrays(self.serving_dir, self.artifact_arrays(recommender))
+
+    @staticmethod
+    def snapshot_from(recommender) -> dict:
+        """The snapshot of a loaded Recommender, sharing its arrays and indexes instead of copying them."""
+        user_ids = np.array(list(recommender.user_index), dtype=np.float64)
+        return {
+            "user_ids": user_ids,
+            "user_order": np.argsort(user_ids, kind="stable"),
+            "user_profiles": recommender.user_profiles,
+            "indexes": recommender.indexes,
+            "items": {key: recommender.partition_items(*key) for key in recommender.partitions},
+        }
+
+    @staticmethod
+    def build_snapshot(arrays: dict) -> dict:
+        partitions = list(zip(arrays["occasions"].tolist(), arrays["categories"].tolist()))
+        indexes, items = {}, {}
+        for i, key in enumerate(partitions):
+            index_arrays = {name[len(f"{i}.index."):]: array for name, array in arrays.items() if name.startswith(f"{i}.index.")}
+            indexes[key] = SCORING_BACKENDS[str(arrays["backends"][i])].from_arrays(index_arrays)
+            items[key] = {col: arrays[f"{i}.item.{col}"] for col in ITEM_COLUMNS}
+        return {
+            "user_ids": arrays["user_ids"],
+            "user_order": arrays["user_order"],
+            "user_profiles": arrays["user_profiles"] if "user_profiles" in arrays else
+            SparseRows.from_arrays({name[len("user_items."):]: array for name, array in arrays.items() if name.startswith("user_items.")}),
+            "indexes": indexes,
+            "items": items,
+        }
+
+    def reload_if_changed(self) -> bool:
+        """Load the artifact if it changed; requests use the previous version until the new one is ready."""
+        try:
+            version = current_generation(self.serving_dir)
+        except FileNotFoundError:
+            return False
+        # Only one thread rebuilds; the others keep serving the current snapshot
+        if version == self.version or not self.reload_lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                arrays = map_arrays(self.serving_dir, version[1])
+            except FileNotFoundError:
+                # A newer publish deleted this generation after CURRENT was read: keep
+                # serving the current snapshot and pick up the newest one next request
+                return False
+            snapshot = self.build_snapshot(arrays)
+            self.snapshot = snapshot
+            self.version = version
+            self.result_cache.clear()
+        finally:
+            self.reload_lock.release()
+        return True
+
+    def build_from_interactions(self):
+        """Build the model from the interactions file when no artifact exists; slow, as it runs the full Recommender."""
+        from .recommendation import Recommender
+
+        recommender = Recommender()
+        recommender.load_interactions()
+        self.snapshot = recommender.snapshot
+        self.result_cache.clear()
+
+    @property
+    def partitions(self) -> list:
+        return list(self.snapshot["indexes"]) if self.snapshot is not None else []
+
+    @property
+    def user_ids(self) -> list:
+        return self.snapshot["user_ids"].tolist() if self.snapshot is not None else []
+
+    def recommend_many(self, queries: list) -> list:
+        """Recommend for many (user_id, occasion, category, top_n) queries; see recommend_snapshot."""
+        # Read the snapshot once so a concurrent reload cannot mix two versions
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise ValueError("Serving model not loaded. Call reload_if_changed() or build_from_interactions() first.")
+        return recommend_snapshot(snapshot, queries, self.result_cache, self.metrics)
+
+    def recommend_items(self, user_id: str, occasion: str, category: str, top_n: int = Config.NUM_RECOMMENDATIONS) -> list:
+        return self.recommend_many([(user_id, occasion, category, top_n)])[0]
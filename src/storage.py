@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pandas as pd
+from .config import Config
+
+# DataFrame artifacts are stored as pickles or as Parquet files, chosen by file extension
+PARQUET_EXTENSION = ".parquet"
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1] == PARQUET_EXTENSION
+
+
+def save_frame(df: pd.DataFrame, path: str, partition_cols: list = None):
+    """Save a DataFrame as a pickle or, for .parquet paths, as Parquet with one run of row groups per partition.
+
+    The file is written under a temporary name and then renamed over path, so
+    readers see either the previous version or the complete new one.
+    """
+    root, extension = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{extension}"
+    try:
+        if is_parquet(path):
+            _write_parquet(df, tmp_path, partition_cols)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_parquet(df: pd.DataFrame, path: str, partition_cols: list = None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partition_cols = [col for col in partition_cols or [] if col in df.columns]
+    if partition_cols:
+        # Rows of a partition are written together, so the min/max statistics of each
+        # row group let readers filtering on the partition columns skip all the others
+        df = df.sort_values(partition_cols, kind="stable")
+        keys = df[partition_cols].astype(str).to_numpy()
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]) if len(df) else np.array([], dtype=int)
+    else:
+        starts = np.array([0])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    bounds = np.r_[starts, len(df)]
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            writer.write_table(table.slice(start, stop - start), row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+
+
+def load_frame(path: str, columns=None, filters: list = None) -> pd.DataFrame:
+    """Load a DataFrame saved by save_frame.
+
+    columns is a list of names to read, or a function mapping the stored column
+    names to the names to read. filters is a list of (column, "==", value) tuples;
+    Parquet files only read the row groups that can match them.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Data file not found at {path}")
+
+    if not is_parquet(path):
+        df = pd.read_pickle(path)
+        if callable(columns):
+            columns = columns(list(df.columns))
+        if filters:
+            mask = np.logical_and.reduce([df[col] == value for col, _, value in filters])
+            df = df[mask].reset_index(drop=True)
+        return df if columns is None else df[columns]
+
+    import pyarrow.parquet as pq
+
+    if callable(columns):
+        columns = columns(pq.read_schema(path).names)
+    return pd.read_parquet(path, columns=columns, filters=filters or None)
@@ -1,9 +1,20 @@
 import logging
 import re
+from typing import TYPE_CHECKING
+from .config import Config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ASCII characters clean_text removes: everything but lowercase letters and whitespace
+ASCII_DELETE = bytes(i for i in range(128) if not (chr(i).islower() or chr(i).isspace()))
 
 class LoggerFactory:
     @staticmethod
-    def create_logger(level=logging.INFO):
+    def create_logger(level=None):
+        # Config.DEBUG_DIAGNOSTICS also turns on debug logging, e.g. per-request stage timings
+        if level is None:
+            level = logging.DEBUG if Config.DEBUG_DIAGNOSTICS else logging.INFO
         logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=level)
         return logging.getLogger()
 
@@ -17,3 +28,16 @@ class TextCleaner:
         text = text.strip()
         return text
 
+
+    @staticmethod
+    def clean_text_series(texts: "pd.Series") -> "pd.Series":
+        """clean_text over a whole column, deleting characters with bytes.translate for ASCII text."""
+        # Imported here so the serving app can use LoggerFactory without loading pandas
+        import pandas as pd
+
+        cleaned = [
+            text.lower().encode("ascii").translate(None, ASCII_DELETE).decode("ascii").strip()
+            if isinstance(text, str) and text.isascii() else TextCleaner.clean_text(text)
+            for text in texts
+        ]
+        return pd.Series(cleaned, index=texts.index, name=texts.name, dtype=object)
@@ -0,0 +1,278 @@
+import time
+import numpy as np
+from .config import Config
+
+class ExactIndex:
+    """Brute-force inner-product search over row vectors.
+
+    Each row is stored as column blocks (e.g. dense features plus a read-only
+    memory-mapped embedding slice) that are never copied or normalized in place;
+    scores are scaled by the rows' inverse L2 norms instead. Rows can be grouped
+    into contiguous runs (one run per item) and search then returns the best
+    groups, scoring each group by its best row.
+    """
+    backend = "exact"
+
+    def __init__(self, blocks: list, offsets: np.ndarray = None, inverse_norms: np.ndarray = None):
+        self.blocks = blocks
+        self.offsets = offsets
+        self.inverse_norms = inverse_norms
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.blocks[0]) if self.offsets is None else len(self.offsets)
+
+    def search(self, queries: np.ndarray, k: int):
+        """Return (scores, group ids) of the top k groups per query, best first."""
+        group_scores = np.zeros((len(queries), len(self.blocks[0])), dtype=np.float32)
+        start = 0
+        for block in self.blocks:
+            width = block.shape[1]
+            group_scores += queries[:, start:start + width] @ block.T
+            start += width
+        if self.inverse_norms is not None:
+            group_scores *= self.inverse_norms
+        if self.offsets is not None:
+            group_scores = np.maximum.reduceat(group_scores, self.offsets, axis=1)
+        ids = top_k(group_scores, min(k, self.n_groups))
+        return np.take_along_axis(group_scores, ids, axis=1), ids
+
+    def to_arrays(self) -> dict:
+        """Rows as one dense matrix of normalized vectors, detached from the blocks they were read from."""
+        arrays = {"vectors": dense_vectors(self.blocks, self.inverse_norms)}
+        if self.offsets is not None:
+            arrays["offsets"] = self.offsets
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "ExactIndex":
+        return cls([arrays["vectors"]], arrays.get("offsets"))
+
+
+class IVFIndex:
+    """Inverted-file index: a spherical k-means coarse quantizer with one posting list per centroid.
+
+    A query only scores the rows stored in its n_probe closest lists, so recall
+    trades off against latency through n_probe.
+    """
+    backend = "ivf"
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, vectors: np.ndarray, row_groups: np.ndarray,
+                 n_probe: int = Config.IVF_N_PROBE):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.vectors = vectors
+        self.row_groups = row_groups
+        self.n_groups = int(row_groups.max()) + 1 if len(row_groups) else 0
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, offsets: np.ndarray = None, n_lists: int = Config.IVF_N_LISTS,
+              n_probe: int = Config.IVF_N_PROBE, n_iter: int = Config.IVF_TRAIN_ITERATIONS, seed: int = 0) -> "IVFIndex":
+        """Cluster the rows and store them grouped by list."""
+        n_rows = len(vectors)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        # Train on a sample, then assign every row to its closest centroid
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n_rows, size=min(n_rows, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = sample[assignment == i]
+                if len(members):
+                    centroids[i] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            np.divide(centroids, norms, out=centroids, where=norms > 0)
+
+        assignment = np.concatenate([
+            np.argmax(vectors[start:start + Config.BATCH_BLOCK_SIZE] @ centroids.T, axis=1)
+            for start in range(0, n_rows, Config.BATCH_BLOCK_SIZE)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+        groups = np.arange(n_rows) if offsets is None else np.repeat(np.arange(len(offsets)), np.diff(offsets, append=n_rows))
+        return cls(centroids, list_offsets, np.ascontiguousarray(vectors[order]), groups[order], n_probe)
+
+    def search(self, queries: np.ndarray, k: int):
+        """Return (scores, group ids) of the top k groups per query, best first; missing results are -1."""
+        k = min(k, self.n_groups)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = top_k(queries @ self.centroids.T, n_probe)
+        for q, query in enumerate(queries):
+            rows = np.concatenate([np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probes[q]])
+            row_scores = self.vectors[rows] @ query
+            found_scores, found_ids = best_groups(row_scores, self.row_groups[rows], k)
+            scores[q, :len(found_ids)] = found_scores
+            ids[q, :len(found_ids)] = found_ids
+        return scores, ids
+
+    def to_arrays(self) -> dict:
+        return {
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "vectors": self.vectors,
+            "row_groups": self.row_groups,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "IVFIndex":
+        return cls(arrays["centroids"], arrays["list_offsets"], arrays["vectors"], arrays["row_groups"])
+
+
+class FaissHNSWIndex:
+    """HNSW graph index backed by faiss, available when faiss is installed."""
+    backend = "faiss"
+
+    def __init__(self, index, row_groups: np.ndarray, oversample: int = Config.VECTOR_INDEX_OVERSAMPLE):
+        self.index = index
+        self.row_groups = row_groups
+        self.n_groups = int(row_groups.max()) + 1 if len(row_groups) else 0
+        self.oversample = oversample
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, offsets: np.ndarray = None, m: int = Config.HNSW_M) -> "FaissHNSWIndex":
+        import faiss
+
+        index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        n_rows = len(vectors)
+        groups = np.arange(n_rows) if offsets is None else np.repeat(np.arange(len(offsets)), np.diff(offsets, append=n_rows))
+        return cls(index, groups)
+
+    def search(self, queries: np.ndarray, k: int):
+        """Return (scores, group ids) of the top k groups per query, best first; missing results are -1."""
+        k = min(k, self.n_groups)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        # Several rows can belong to one group, so fetch extra rows before deduplicating
+        row_scores, rows = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k * self.oversample)
+        for q in range(len(queries)):
+            found = rows[q] >= 0
+            found_scores, found_ids = best_groups(row_scores[q][found], self.row_groups[rows[q][found]], k)
+            scores[q, :len(found_ids)] = found_scores
+            ids[q, :len(found_ids)] = found_ids
+        return scores, ids
+
+    def to_arrays(self) -> dict:
+        import faiss
+
+        return {"index": faiss.serialize_index(self.index), "row_groups": self.row_groups}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "FaissHNSWIndex":
+        import faiss
+
+        return cls(faiss.deserialize_index(arrays["index"]), arrays["row_groups"])
+
+
+INDEX_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+    "faiss": FaissHNSWIndex,
+}
+
+
+def build_index(backend: str, blocks: list, offsets: np.ndarray = None, inverse_norms: np.ndarray = None):
+    """Build a vector index of the given backend over rows split into column blocks."""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend '{backend}'. Expected one of {tuple(INDEX_BACKENDS)}.")
+    if backend == "exact":
+        return ExactIndex(blocks, offsets, inverse_norms)
+    return INDEX_BACKENDS[backend].build(dense_vectors(blocks, inverse_norms), offsets)
+
+
+def inverse_norms(blocks: list) -> np.ndarray:
+    """Inverse L2 norm of every row split across column blocks; all-zero rows get 0."""
+    squared = sum(np.einsum("ij,ij->i", block, block, dtype=np.float32) for block in blocks)
+    norms = np.sqrt(squared)
+    return np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0).astype(np.float32)
+
+
+def dense_vectors(blocks: list, inverse_norms: np.ndarray = None) -> np.ndarray:
+    """Concatenate column blocks into one float32 matrix of L2-normalized rows."""
+    vectors = np.hstack([np.asarray(block, dtype=np.float32) for block in blocks])
+    if inverse_norms is not None:
+        vectors *= inverse_norms[:, np.newaxis]
+    return vectors
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the column indices of the top k scores in each row, best first."""
+    n_cols = scores.shape[1]
+    if k < n_cols:
+        candidates = np.argpartition(-scores, k, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n_cols), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def best_groups(row_scores: np.ndarray, row_groups: np.ndarray, k: int):
+    """Reduce row scores to the k best groups, scoring each group by its best row."""
+    order = np.argsort(-row_scores, kind="stable")
+    _, first = np.unique(row_groups[order], return_index=True)
+    best = order[np.sort(first)[:k]]
+    return row_scores[best], row_groups[best]
+
+
+def save_indexes(indexes: dict, path: str, **metadata):
+    """Save per-partition indexes, keyed by (occasion, category), into one .npz file."""
+    arrays = {f"meta.{key}": np.asarray(value) for key, value in metadata.items()}
+    keys = list(indexes)
+    arrays["meta.occasions"] = np.array([occasion for occasion, _ in keys], dtype=str)
+    arrays["meta.categories"] = np.array([category for _, category in keys], dtype=str)
+    arrays["meta.backends"] = np.array([indexes[key].backend for key in keys], dtype=str)
+    for i, key in enumerate(keys):
+        for name, array in indexes[key].to_arrays().items():
+            arrays[f"{i}.{name}"] = array
+    np.savez(path, **arrays)
+
+
+def load_indexes(path: str):
+    """Load indexes saved by save_indexes; returns (indexes, metadata)."""
+    with np.load(path) as data:
+        files = {name: data[name] for name in data.files}
+
+    metadata = {name[len("meta."):]: files[name] for name in files if name.startswith("meta.")}
+    indexes = {}
+    for i, key in enumerate(zip(metadata.pop("occasions").tolist(), metadata.pop("categories").tolist())):
+        prefix = f"{i}."
+        arrays = {name[len(prefix):]: array for name, array in files.items() if name.startswith(prefix)}
+        indexes[key] = INDEX_BACKENDS[str(metadata["backends"][i])].from_arrays(arrays)
+    metadata.pop("backends")
+    return indexes, {key: value.item() for key, value in metadata.items()}
+
+
+def recall_latency_report(exact_indexes: dict, candidate_indexes: dict, queries: np.ndarray, k: int) -> dict:
+    """Compare a candidate index set against exact search: mean recall@k and per-query latency in ms."""
+    recalls, exact_ms, candidate_ms = [], [], []
+    for key, exact in exact_indexes.items():
+        candidate = candidate_indexes[key]
+        for query in queries:
+            start = time.perf_counter()
+            _, expected = exact.search(query[np.newaxis, :], k)
+            exact_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            _, found = candidate.search(query[np.newaxis, :], k)
+            candidate_ms.append((time.perf_counter() - start) * 1000)
+
+            if expected.shape[1]:
+                recalls.append(len(np.intersect1d(expected[0], found[0])) / expected.shape[1])
+
+    return {
+        "recall_at_k": float(np.mean(recalls)) if recalls else 1.0,
+        "exact_ms_p50": float(np.percentile(exact_ms, 50)),
+        "exact_ms_p99": float(np.percentile(exact_ms, 99)),
+        "candidate_ms_p50": float(np.percentile(candidate_ms, 50)),
+        "candidate_ms_p99": float(np.percentile(candidate_ms, 99)),
+    }